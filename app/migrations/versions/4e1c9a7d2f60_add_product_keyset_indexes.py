@@ -0,0 +1,36 @@
+"""add product keyset indexes
+
+Revision ID: 4e1c9a7d2f60
+Revises: b7d2e4a91c3f
+Create Date: 2026-10-18 13:04:17.220931
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4e1c9a7d2f60"
+down_revision = "b7d2e4a91c3f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        op.f("ix__product__name_id"),
+        "product",
+        ["name", "id"],
+        unique=False,
+        schema="shopper",
+    )
+    op.create_index(
+        op.f("ix__product__price_id"),
+        "product",
+        ["price", "id"],
+        unique=False,
+        schema="shopper",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix__product__price_id"), table_name="product", schema="shopper")
+    op.drop_index(op.f("ix__product__name_id"), table_name="product", schema="shopper")
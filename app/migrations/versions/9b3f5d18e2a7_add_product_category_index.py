@@ -0,0 +1,32 @@
+"""add product category index
+
+Revision ID: 9b3f5d18e2a7
+Revises: 4e1c9a7d2f60
+Create Date: 2026-10-18 15:41:09.614752
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9b3f5d18e2a7"
+down_revision = "4e1c9a7d2f60"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        op.f("ix__product__category_id_id"),
+        "product",
+        ["category_id", "id"],
+        unique=False,
+        schema="shopper",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix__product__category_id_id"),
+        table_name="product",
+        schema="shopper",
+    )
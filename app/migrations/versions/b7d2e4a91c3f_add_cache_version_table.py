@@ -0,0 +1,54 @@
+"""add cache_version table
+
+Revision ID: b7d2e4a91c3f
+Revises: 6861747480bc
+Create Date: 2026-10-18 10:12:41.503118
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b7d2e4a91c3f"
+down_revision = "6861747480bc"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "cache_version",
+        sa.Column("name", sa.String(length=50), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("name", name=op.f("pk__cache_version__name")),
+        schema="shopper",
+    )
+    op.execute(
+        "INSERT INTO shopper.cache_version (name, version) VALUES ('category', 0)",
+    )
+    op.execute(
+        """
+        CREATE FUNCTION shopper.bump_cache_version() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO shopper.cache_version (name, version)
+            VALUES (TG_ARGV[0], 1)
+            ON CONFLICT (name)
+            DO UPDATE SET version = shopper.cache_version.version + 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    )
+    op.execute(
+        """
+        CREATE TRIGGER category_cache_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON shopper.category
+        FOR EACH STATEMENT EXECUTE FUNCTION shopper.bump_cache_version('category')
+        """,
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER category_cache_version ON shopper.category")
+    op.execute("DROP FUNCTION shopper.bump_cache_version()")
+    op.drop_table("cache_version", schema="shopper")
@@ -0,0 +1,48 @@
+"""add metadata gin indexes
+
+Revision ID: c58a0e6b7d41
+Revises: 9b3f5d18e2a7
+Create Date: 2026-10-18 16:27:53.118406
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c58a0e6b7d41"
+down_revision = "9b3f5d18e2a7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        op.f("ix__product__metadata"),
+        "product",
+        ["metadata"],
+        unique=False,
+        schema="shopper",
+        postgresql_using="gin",
+        postgresql_ops={"metadata": "jsonb_path_ops"},
+    )
+    op.create_index(
+        op.f("ix__category__metadata"),
+        "category",
+        ["metadata"],
+        unique=False,
+        schema="shopper",
+        postgresql_using="gin",
+        postgresql_ops={"metadata": "jsonb_path_ops"},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix__category__metadata"),
+        table_name="category",
+        schema="shopper",
+    )
+    op.drop_index(
+        op.f("ix__product__metadata"),
+        table_name="product",
+        schema="shopper",
+    )
@@ -0,0 +1,56 @@
+"""add product search indexes
+
+Revision ID: d3a8f61c2b95
+Revises: c58a0e6b7d41
+Create Date: 2026-10-18 17:42:10.524871
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d3a8f61c2b95"
+down_revision = "c58a0e6b7d41"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        op.f("ix__product__name_trgm"),
+        "product",
+        ["name"],
+        unique=False,
+        schema="shopper",
+        postgresql_using="gin",
+        postgresql_ops={"name": "gin_trgm_ops"},
+    )
+    op.create_index(
+        op.f("ix__product__search"),
+        "product",
+        [
+            sa.text(
+                "(setweight(to_tsvector('simple'::regconfig, name), 'A') || "
+                "setweight(jsonb_to_tsvector('simple'::regconfig, "
+                "coalesce(metadata, '{}'::jsonb), '[\"string\"]'::jsonb), 'B'))",
+            ),
+        ],
+        unique=False,
+        schema="shopper",
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix__product__search"),
+        table_name="product",
+        schema="shopper",
+    )
+    op.drop_index(
+        op.f("ix__product__name_trgm"),
+        table_name="product",
+        schema="shopper",
+    )
+    # pg_trgm is left installed, it may be used outside of this schema
@@ -0,0 +1,49 @@
+"""add permission cache version
+
+Revision ID: e5f2c7a3b816
+Revises: d3a8f61c2b95
+Create Date: 2026-10-18 21:06:37.218054
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e5f2c7a3b816"
+down_revision = "d3a8f61c2b95"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "INSERT INTO shopper.cache_version (name, version) VALUES ('permission', 0)",
+    )
+    # a new role grants nothing until it is assigned
+    op.execute(
+        """
+        CREATE TRIGGER role_permission_version
+        AFTER UPDATE OR DELETE OR TRUNCATE ON shopper.role
+        FOR EACH STATEMENT EXECUTE FUNCTION shopper.bump_cache_version('permission')
+        """,
+    )
+    op.execute(
+        """
+        CREATE TRIGGER user_role_permission_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON shopper.user_role
+        FOR EACH STATEMENT EXECUTE FUNCTION shopper.bump_cache_version('permission')
+        """,
+    )
+    op.execute(
+        """
+        CREATE TRIGGER user_permission_version
+        AFTER DELETE OR TRUNCATE ON shopper."user"
+        FOR EACH STATEMENT EXECUTE FUNCTION shopper.bump_cache_version('permission')
+        """,
+    )
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER user_permission_version ON shopper."user"')
+    op.execute("DROP TRIGGER user_role_permission_version ON shopper.user_role")
+    op.execute("DROP TRIGGER role_permission_version ON shopper.role")
+    op.execute("DELETE FROM shopper.cache_version WHERE name = 'permission'")
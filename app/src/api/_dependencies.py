@@ -1,12 +1,12 @@
-from functools import reduce
-from typing import Annotated, AsyncGenerator
+from typing import Annotated, AsyncGenerator, TypeAlias
 
 from fastapi import Depends, HTTPException, status
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.core.db import engine
-from src.core.role import Entity, Permission
-from src.models import Role, User, UserRole
+from src.core.role import Entity, Permission, permission_mask
+from src.models import User
+from src.schemas.role import UserPermissions
+from src.services import permission_service
 
 from ._utils import Token, get_token
 
@@ -31,63 +31,45 @@ async def get_user(
     return user
 
 
-def permission_required(
-    entity: Entity,
-    permissions: Permission | tuple[Permission, ...] | list[Permission],
-):
-    if not isinstance(permissions, (tuple, list)):
-        permissions = (permissions,)
+_Permissions: TypeAlias = Permission | tuple[Permission, ...] | list[Permission]
 
-    async def validate(
-        session: Annotated[AsyncSession, Depends(get_session)],
-        user: Annotated[User, Depends(get_user)],
-    ) -> None:
-        roles = (
-            await session.scalars(
-                select(Role)
-                .select_from(User)
-                .join(UserRole, User.id_ == UserRole.user_id)
-                .join(Role, UserRole.role_id == Role.id_)
-                .where(User.id_ == user.id_),
-            )
-        ).all()
-
-        aggregated_entity_permissions = {}
-        if roles:
-            aggregated_entity_permissions = reduce(
-                lambda d1, d2: {**d1, **d2},
-                map(lambda d: d.permissions, roles),
-            )
-
-        exc_response = HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You have not enough rights",
-        )
 
-        any_entity_permissions = list(
-            map(
-                Permission,
-                aggregated_entity_permissions.get(Entity.ANY.value, []),
-            ),
+def permissions_required(requirements: dict[Entity, _Permissions]):
+    required = {
+        entity: permission_mask(
+            permissions if isinstance(permissions, (tuple, list)) else (permissions,),
         )
+        for entity, permissions in requirements.items()
+    }
 
-        entity_permissions = (
-            list(
-                map(
-                    Permission,
-                    aggregated_entity_permissions.get(entity.value, []),
-                ),
+    async def validate(
+        token: Annotated[Token, Depends(get_token)],
+        session: Annotated[AsyncSession, Depends(get_session)],
+    ) -> None:
+        if (
+            token.permissions is not None
+            and token.role_version is not None
+            and await permission_service.is_current(session, token.role_version)
+        ):
+            user_permissions = UserPermissions(masks=token.permissions)
+
+        else:
+            user = await get_user(token, session)
+            user_permissions = await permission_service.get(session, user.id_.hex)
+
+        denied = [
+            entity.value
+            for entity, mask in required.items()
+            if not user_permissions.allows(entity, mask)
+        ]
+        if denied:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"You have not enough rights for: {', '.join(denied)}",
             )
-            + any_entity_permissions
-        )
-
-        if not entity_permissions:
-            raise exc_response
 
-        if Permission.ALL in entity_permissions:
-            entity_permissions.extend(list(iter(Permission)))
+    return validate
 
-        if set(permissions) - set(entity_permissions):
-            raise exc_response
 
-    return validate
+def permission_required(entity: Entity, permissions: _Permissions):
+    return permissions_required({entity: permissions})
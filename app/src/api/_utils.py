@@ -1,39 +1,188 @@
+import hashlib
+import json
 import time
+from collections import OrderedDict
 from functools import partial
+from typing import Annotated, Callable
 
-from fastapi import HTTPException, Request, status
+from fastapi import HTTPException, Query, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError
 from pydantic import BaseModel
 from src.core.security import jwt_decode, jwt_encode
 from src.core.settings import settings
+from src.schemas.filters import MetadataFilter
+from src.schemas.role import UserPermissions
+from src.services.cache import CacheStats
 
 
 class Token(BaseModel):
     user_id: str
     expires: float
+    # compiled permissions, trusted while role_version is current
+    permissions: dict[str, int] | None
+    role_version: int | None
 
 
-def create_access_token(user_id: str) -> tuple[str, float]:
+def create_access_token(
+    user_id: str,
+    permissions: UserPermissions | None = None,
+    role_version: int | None = None,
+) -> tuple[str, float]:
     expires = time.time() + settings.TOKEN_LIFETIME
     payload = Token(
         user_id=user_id,
         expires=expires,
+        permissions=permissions.masks if permissions else None,
+        role_version=role_version,
     )
-    token = jwt_encode(payload.dict())
+    token = jwt_encode(payload.dict(exclude_none=True))
 
     return token, expires
 
 
+class _TokenCache:
+    _entries: OrderedDict[bytes, Token]
+
+    def __init__(self, maxsize: int) -> None:
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+
+        self.stats = CacheStats()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: bytes) -> Token | None:
+        token = self._entries.get(key)
+        if not token or token.expires < time.time():
+            self._entries.pop(key, None)
+            self.stats.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+
+        return token
+
+    def put(self, key: bytes, token: Token) -> None:
+        self._entries[key] = token
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+
+# only successfully verified tokens get here, so a hit skips the signature check
+token_cache = _TokenCache(maxsize=settings.TOKEN_CACHE_MAXSIZE)
+
+
 def verify_access_token(token: str) -> Token | None:
+    key = hashlib.sha256(token.encode()).digest()
+
+    payload = token_cache.get(key)
+    if payload:
+        return payload
+
     payload = Token.parse_obj(jwt_decode(token))
 
     if payload.expires >= time.time():
+        token_cache.put(key, payload)
         return payload
 
     return None
 
 
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    # If-None-Match uses the weak comparison
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+def sparse_fields(
+    model: type[BaseModel],
+    required: tuple[str, ...] = ("id_",),
+) -> Callable[..., list[str] | None]:
+    allowed = list(model.__fields__)
+
+    def dependency(
+        fields: Annotated[
+            str | None,
+            Query(description=f"Comma-separated subset of: {', '.join(allowed)}"),
+        ] = None,
+    ) -> list[str] | None:
+        if not fields:
+            return None
+
+        requested = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = requested.difference(allowed)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+            )
+
+        requested.update(required)
+
+        return [field for field in allowed if field in requested]
+
+    return dependency
+
+
+def metadata_filter(
+    metadata: Annotated[
+        list[str] | None,
+        Query(
+            description=(
+                'JSON object for containment ({"color": "red"}), '
+                "key:value for top-level equality, bare key for existence"
+            ),
+        ),
+    ] = None,
+) -> MetadataFilter | None:
+    if not metadata:
+        return None
+
+    metadata_filter = MetadataFilter()
+    for value in metadata:
+        if value.startswith("{"):
+            try:
+                contains = json.loads(value)
+            except ValueError:
+                contains = None
+
+            if not isinstance(contains, dict):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Invalid metadata filter: {value}",
+                )
+
+            metadata_filter.contains.append(contains)
+
+        elif ":" in value:
+            key, raw = value.split(":", 1)
+            try:
+                parsed = json.loads(raw)
+            except ValueError:
+                parsed = raw
+
+            metadata_filter.contains.append({key: parsed})
+
+        else:
+            metadata_filter.has_keys.append(value)
+
+    return metadata_filter
+
+
 class JWTBearer(HTTPBearer):
     def __init__(self, auto_error: bool = True):
         super(JWTBearer, self).__init__(auto_error=auto_error)
@@ -3,11 +3,14 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.core.security import verify_password
+from src.core.role import Entity, Permission
+from src.core.security import PasswordPoolStats, password_pool
+from src.core.settings import settings
 from src.models import User
 from src.schemas.auth import UserAuthSuccessful, UserLogin
+from src.services import permission_service
 
-from ._dependencies import get_session
+from ._dependencies import get_session, permission_required
 from ._utils import create_access_token
 
 router = APIRouter(tags=["auth"])
@@ -41,9 +44,33 @@ async def auth(
     if not user:
         raise not_found_exc
 
-    if not verify_password(user_login.password, user.password_hash):
+    if not await password_pool.verify(user_login.password, user.password_hash):
         raise not_found_exc
 
-    token, expires = create_access_token(user.id_.hex)
+    permissions, role_version = None, None
+    if settings.TOKEN_EMBED_PERMISSIONS:
+        permissions, role_version = await permission_service.get_versioned(
+            session,
+            user.id_.hex,
+        )
+
+    token, expires = create_access_token(user.id_.hex, permissions, role_version)
 
     return UserAuthSuccessful(token=token, expires=expires)
+
+
+@router.get(
+    "/password-pool",
+    dependencies=[
+        Depends(
+            permission_required(
+                Entity.ANY,
+                permissions=(Permission.Read,),
+            ),
+        ),
+    ],
+    response_model=PasswordPoolStats,
+    status_code=status.HTTP_200_OK,
+)
+async def password_pool_stats():
+    return password_pool.stats
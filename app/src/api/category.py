@@ -1,12 +1,18 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.core.role import Entity, Permission
-from src.schemas.category import Category, CreateCategory, UpdateCategory
+from src.core.settings import settings
+from src.schemas.batch import Batch
+from src.schemas.category import Category, CategoryNode, CreateCategory, UpdateCategory
+from src.schemas.filters import MetadataFilter
 from src.services import category_service
+from src.services.utils import canonical_id
 
 from ._dependencies import get_session, permission_required
+from ._utils import etag_matches, metadata_filter, sparse_fields
 
 router = APIRouter(tags=["category"])
 
@@ -26,12 +32,74 @@ router = APIRouter(tags=["category"])
 )
 async def get_all(
     session: Annotated[AsyncSession, Depends(get_session)],
+    depth: Annotated[int | None, Query(ge=0)] = None,
+    root_id: str | None = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+    metadata: Annotated[MetadataFilter | None, Depends(metadata_filter)] = None,
+    fields: Annotated[list[str] | None, Depends(sparse_fields(CategoryNode))] = None,
 ):
-    categories = await category_service.get_all(session)
+    if fields:
+        projected = await category_service.get_all_fields(
+            session,
+            fields,
+            depth=depth,
+            root_id=root_id,
+            metadata=metadata,
+        )
+        if projected is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Invalid root id",
+            )
+
+        return JSONResponse(projected)
+
+    if depth is None and root_id is None and metadata is None:
+        content, etag = await category_service.get_all_encoded(session)
+        headers = {"ETag": etag}
+
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        return Response(content, media_type="application/json", headers=headers)
+
+    categories = await category_service.get_all(
+        session,
+        depth=depth,
+        root_id=root_id,
+        metadata=metadata,
+    )
+    if categories is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Invalid root id",
+        )
 
     return categories
 
 
+@router.get(
+    "/batch",
+    dependencies=[
+        Depends(
+            permission_required(
+                Entity.Category,
+                permissions=(Permission.Read,),
+            ),
+        ),
+    ],
+    response_model=Batch[Category],
+    status_code=status.HTTP_200_OK,
+)
+async def get_many(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    ids: Annotated[list[str], Query(min_items=1, max_items=settings.BATCH_MAX_IDS)],
+):
+    batch = await category_service.get_many(session, ids)
+
+    return batch
+
+
 @router.get(
     "/{id_}",
     dependencies=[
@@ -48,12 +116,77 @@ async def get_all(
 async def get_one(
     id_: str,
     session: Annotated[AsyncSession, Depends(get_session)],
+    fields: Annotated[list[str] | None, Depends(sparse_fields(CategoryNode))] = None,
 ):
+    if fields:
+        projected = await category_service.get_fields(session, id_, fields)
+        if projected is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Invalid category id",
+            )
+
+        return JSONResponse(projected)
+
     categories = await category_service.get(session, id_)
 
     return categories
 
 
+@router.get(
+    "/{id_}/ancestors",
+    dependencies=[
+        Depends(
+            permission_required(
+                Entity.Category,
+                permissions=(Permission.Read,),
+            ),
+        ),
+    ],
+    response_model=list[CategoryNode],
+    status_code=status.HTTP_200_OK,
+)
+async def get_ancestors(
+    id_: str,
+    session: Annotated[AsyncSession, Depends(get_session)],
+):
+    ancestors = await category_service.get_ancestors(session, id_)
+    if ancestors is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Invalid category id",
+        )
+
+    return ancestors
+
+
+@router.get(
+    "/{id_}/descendants",
+    dependencies=[
+        Depends(
+            permission_required(
+                Entity.Category,
+                permissions=(Permission.Read,),
+            ),
+        ),
+    ],
+    response_model=list[CategoryNode],
+    status_code=status.HTTP_200_OK,
+)
+async def get_descendants(
+    id_: str,
+    session: Annotated[AsyncSession, Depends(get_session)],
+):
+    descendants = await category_service.get_descendants(session, id_)
+    if descendants is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Invalid category id",
+        )
+
+    return descendants
+
+
 @router.post(
     "/",
     dependencies=[
@@ -102,14 +235,9 @@ async def update_one(
     update_category: UpdateCategory,
     session: Annotated[AsyncSession, Depends(get_session)],
 ):
-    category = await category_service.get(session, id_)
-    if not category:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Invalid category id",
-        )
-
-    if update_category.parent_id:
+    # the cache keys are hex, the path may hold any form postgres accepts
+    category_id = canonical_id(id_)
+    if update_category.parent_id and category_id:
         parent = await category_service.get(session, update_category.parent_id)
         if not parent:
             raise HTTPException(
@@ -117,7 +245,22 @@ async def update_one(
                 detail="Invalid parent id",
             )
 
+        if parent.id_ == category_id or await category_service.is_descendant(
+            session,
+            parent.id_,
+            category_id,
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Category can not be moved into its own subtree",
+            )
+
     updated_category = await category_service.update(session, id_, update_category)
+    if not updated_category:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Invalid category id",
+        )
 
     return updated_category
 
@@ -138,11 +281,8 @@ async def delete_one(
     id_: str,
     session: Annotated[AsyncSession, Depends(get_session)],
 ):
-    category_obj = await category_service.get(session, id_)
-    if not category_obj:
+    if not await category_service.delete(session, id_):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid category id",
         )
-
-    await category_service.delete(session, id_)
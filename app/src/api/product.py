@@ -1,16 +1,69 @@
-from typing import Annotated
+from typing import Annotated, AsyncIterator
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.core.role import Entity, Permission
-from src.schemas.product import CreateProduct, Product, UpdateProduct
+from src.core.settings import settings
+from src.schemas.batch import Batch
+from src.schemas.filters import MetadataFilter
+from src.schemas.product import (
+    CreateProduct,
+    Product,
+    ProductFacets,
+    ProductFilter,
+    ProductPage,
+    ProductSearchPage,
+    ProductSort,
+    ProductSuggestion,
+    UpdateProduct,
+    UpsertProduct,
+    UpsertProductResult,
+)
 from src.services import category_service, product_service
 
-from ._dependencies import get_session, permission_required
+from ._dependencies import get_session, permission_required, permissions_required
+from ._utils import metadata_filter, sparse_fields
 
 router = APIRouter(tags=["product"])
 
 
+async def product_filter(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    category_id: str | None = None,
+    include_descendants: bool = False,
+    price_min: Annotated[float | None, Query(ge=0)] = None,
+    price_max: Annotated[float | None, Query(ge=0)] = None,
+    metadata: Annotated[MetadataFilter | None, Depends(metadata_filter)] = None,
+) -> ProductFilter:
+    if price_min is not None and price_max is not None and price_min > price_max:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="price_min is greater than price_max",
+        )
+
+    category_ids = None
+    if category_id:
+        category = await category_service.get(session, category_id)
+        if not category:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Invalid category id",
+            )
+
+        category_ids = [category.id_]
+        if include_descendants:
+            descendants = await category_service.get_descendants(session, category.id_)
+            category_ids.extend(descendant.id_ for descendant in descendants or [])
+
+    return ProductFilter(
+        category_ids=category_ids,
+        metadata=metadata,
+        price_min=price_min,
+        price_max=price_max,
+    )
+
+
 @router.get(
     "/",
     dependencies=[
@@ -21,15 +74,169 @@ router = APIRouter(tags=["product"])
             ),
         ),
     ],
-    response_model=list[Product],
+    response_model=ProductPage,
     status_code=status.HTTP_200_OK,
 )
 async def get_all(
     session: Annotated[AsyncSession, Depends(get_session)],
+    filters: Annotated[ProductFilter, Depends(product_filter)],
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+    after: str | None = None,
+    sort: ProductSort = ProductSort.id_,
+    fields: Annotated[list[str] | None, Depends(sparse_fields(Product))] = None,
+):
+    try:
+        if fields:
+            # plain dicts, skipping response model validation
+            return JSONResponse(
+                await product_service.get_page_fields(
+                    session,
+                    fields,
+                    limit=limit,
+                    after=after,
+                    sort=sort,
+                    product_filter=filters,
+                ),
+            )
+
+        page = await product_service.get_page(
+            session,
+            limit=limit,
+            after=after,
+            sort=sort,
+            product_filter=filters,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+
+    return page
+
+
+@router.get(
+    "/search",
+    dependencies=[
+        Depends(
+            permission_required(
+                entity=Entity.Product,
+                permissions=Permission.Read,
+            ),
+        ),
+    ],
+    response_model=ProductSearchPage,
+    status_code=status.HTTP_200_OK,
+)
+async def search(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    q: Annotated[str, Query(min_length=1, max_length=255)],
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    after: str | None = None,
 ):
-    products = await product_service.get_all(session)
+    try:
+        page = await product_service.search(session, q, limit=limit, after=after)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+
+    return page
+
+
+@router.get(
+    "/autocomplete",
+    dependencies=[
+        Depends(
+            permission_required(
+                entity=Entity.Product,
+                permissions=Permission.Read,
+            ),
+        ),
+    ],
+    response_model=list[ProductSuggestion],
+    status_code=status.HTTP_200_OK,
+)
+async def autocomplete(
+    q: Annotated[str, Query(min_length=1, max_length=255)],
+    limit: Annotated[int, Query(ge=1, le=50)] = 10,
+):
+    suggestions = await product_service.autocomplete(q, limit)
 
-    return products
+    return suggestions
+
+
+@router.get(
+    "/facets",
+    dependencies=[
+        Depends(
+            permission_required(
+                entity=Entity.Product,
+                permissions=Permission.Read,
+            ),
+        ),
+    ],
+    response_model=ProductFacets,
+    status_code=status.HTTP_200_OK,
+)
+async def get_facets(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    filters: Annotated[ProductFilter, Depends(product_filter)],
+    buckets: Annotated[int, Query(ge=1, le=100)] = 10,
+):
+    facets = await product_service.get_facets(session, buckets, filters)
+
+    return facets
+
+
+@router.get(
+    "/export",
+    dependencies=[
+        Depends(
+            permission_required(
+                entity=Entity.Product,
+                permissions=Permission.Read,
+            ),
+        ),
+    ],
+    response_class=StreamingResponse,
+    status_code=status.HTTP_200_OK,
+)
+async def export(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    fetch_size: Annotated[
+        int,
+        Query(ge=1, le=10_000),
+    ] = settings.PRODUCT_EXPORT_FETCH_SIZE,
+):
+    async def ndjson() -> AsyncIterator[str]:
+        async for product in product_service.stream(session, fetch_size):
+            yield product.json() + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@router.get(
+    "/batch",
+    dependencies=[
+        Depends(
+            permission_required(
+                entity=Entity.Product,
+                permissions=Permission.Read,
+            ),
+        ),
+    ],
+    response_model=Batch[Product],
+    status_code=status.HTTP_200_OK,
+)
+async def get_many(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    ids: Annotated[list[str], Query(min_items=1, max_items=settings.BATCH_MAX_IDS)],
+):
+    batch = await product_service.get_many(session, ids)
+
+    return batch
 
 
 @router.get(
@@ -48,7 +255,18 @@ async def get_all(
 async def get_one(
     id_: str,
     session: Annotated[AsyncSession, Depends(get_session)],
+    fields: Annotated[list[str] | None, Depends(sparse_fields(Product))] = None,
 ):
+    if fields:
+        projected = await product_service.get_fields(session, id_, fields)
+        if projected is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Invalid product id",
+            )
+
+        return JSONResponse(projected)
+
     product = await product_service.get(session, id_)
 
     return product
@@ -58,15 +276,11 @@ async def get_one(
     "/",
     dependencies=[
         Depends(
-            permission_required(
-                entity=Entity.Product,
-                permissions=(Permission.Create, Permission.Read),
-            ),
-        ),
-        Depends(
-            permission_required(
-                entity=Entity.Category,
-                permissions=Permission.Read,
+            permissions_required(
+                {
+                    Entity.Product: (Permission.Create, Permission.Read),
+                    Entity.Category: Permission.Read,
+                },
             ),
         ),
     ],
@@ -90,19 +304,43 @@ async def add_one(
     return created_product
 
 
-@router.patch(
-    "/{id_}",
+@router.put(
+    "/bulk",
     dependencies=[
         Depends(
-            permission_required(
-                entity=Entity.Product,
-                permissions=(Permission.Update, Permission.Read),
+            permissions_required(
+                {
+                    Entity.Product: (
+                        Permission.Create,
+                        Permission.Update,
+                        Permission.Read,
+                    ),
+                    Entity.Category: Permission.Read,
+                },
             ),
         ),
+    ],
+    response_model=list[UpsertProductResult],
+    status_code=status.HTTP_200_OK,
+)
+async def upsert_many(
+    products: list[UpsertProduct],
+    session: Annotated[AsyncSession, Depends(get_session)],
+):
+    results = await product_service.upsert_many(session, products)
+
+    return results
+
+
+@router.patch(
+    "/{id_}",
+    dependencies=[
         Depends(
-            permission_required(
-                entity=Entity.Category,
-                permissions=Permission.Read,
+            permissions_required(
+                {
+                    Entity.Product: (Permission.Update, Permission.Read),
+                    Entity.Category: Permission.Read,
+                },
             ),
         ),
     ],
@@ -114,13 +352,6 @@ async def update_one(
     update_product: UpdateProduct,
     session: Annotated[AsyncSession, Depends(get_session)],
 ):
-    product_obj = await product_service.get(session, id_)
-    if not product_obj:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Product not found",
-        )
-
     if update_product.category_id:
         category = await category_service.get(session, update_product.category_id)
         if not category:
@@ -130,6 +361,11 @@ async def update_one(
             )
 
     updated_product = await product_service.update(session, id_, update_product)
+    if not updated_product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found",
+        )
 
     return updated_product
 
@@ -150,11 +386,8 @@ async def delete_one(
     id_: str,
     session: Annotated[AsyncSession, Depends(get_session)],
 ):
-    product_obj = await product_service.get(session, id_)
-    if not product_obj:
+    if not await product_service.delete(session, id_):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid product id",
         )
-
-    await product_service.delete(session, id_)
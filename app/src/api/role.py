@@ -1,8 +1,10 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.core.role import Entity, Permission
+from src.core.settings import settings
+from src.schemas.batch import Batch
 from src.schemas.role import CreateRole, Role, UpdateRole
 from src.services import role_service
 
@@ -32,6 +34,28 @@ async def get_all(
     return roles
 
 
+@router.get(
+    "/batch",
+    dependencies=[
+        Depends(
+            permission_required(
+                entity=Entity.Role,
+                permissions=(Permission.Read,),
+            ),
+        ),
+    ],
+    response_model=Batch[Role],
+    status_code=status.HTTP_200_OK,
+)
+async def get_many(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    ids: Annotated[list[str], Query(min_items=1, max_items=settings.BATCH_MAX_IDS)],
+):
+    batch = await role_service.get_many(session, ids)
+
+    return batch
+
+
 @router.get(
     "/{id_}",
     dependencies=[
@@ -94,15 +118,13 @@ async def update_one(
     update_product: UpdateRole,
     session: Annotated[AsyncSession, Depends(get_session)],
 ):
-    role_obj = await role_service.get(session, id_)
-    if not role_obj:
+    updated_role = await role_service.update(session, id_, update_product)
+    if not updated_role:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Role not found",
         )
 
-    updated_role = await role_service.update(session, id_, update_product)
-
     return updated_role
 
 
@@ -122,11 +144,8 @@ async def delete_one(
     id_: str,
     session: Annotated[AsyncSession, Depends(get_session)],
 ):
-    role_obj = await role_service.get(session, id_)
-    if not role_obj:
+    if not await role_service.delete(session, id_):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Invalid product id",
+            detail="Invalid role id",
         )
-
-    await role_service.delete(session, id_)
@@ -1,12 +1,14 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.core.role import Entity, Permission
+from src.core.settings import settings
+from src.schemas.batch import Batch
 from src.schemas.user import CreateUser, UpdateUser, User, UserAlreadyExists
 from src.services import role_service, user_service
 
-from ._dependencies import get_session, permission_required
+from ._dependencies import get_session, permission_required, permissions_required
 
 router = APIRouter(tags=["user"])
 
@@ -26,13 +28,32 @@ async def get_all(session: Annotated[AsyncSession, Depends(get_session)]):
 
 
 @router.get(
-    "/{id_}",
+    "/batch",
     dependencies=[
         Depends(
             permission_required(Entity.User, Permission.Read),
         ),
+    ],
+    status_code=200,
+    response_model=Batch[User],
+)
+async def get_many(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    ids: Annotated[list[str], Query(min_items=1, max_items=settings.BATCH_MAX_IDS)],
+):
+    return await user_service.get_many(session, ids)
+
+
+@router.get(
+    "/{id_}",
+    dependencies=[
         Depends(
-            permission_required(Entity.Role, Permission.Read),
+            permissions_required(
+                {
+                    Entity.User: Permission.Read,
+                    Entity.Role: Permission.Read,
+                },
+            ),
         ),
     ],
     status_code=status.HTTP_200_OK,
@@ -110,15 +131,13 @@ async def update_one(
     update_user: UpdateUser,
     session: Annotated[AsyncSession, Depends(get_session)],
 ):
-    user = await user_service.get(session, id_)
+    user = await user_service.update(session, id_, update_user)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Invalid user id",
         )
 
-    user = await user_service.update(session, id_, update_user)
-
     return user
 
 
@@ -138,22 +157,22 @@ async def delete_one(
     id_: str,
     session: Annotated[AsyncSession, Depends(get_session)],
 ):
-    await user_service.delete(session, id_)
+    if not await user_service.delete(session, id_):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Invalid user id",
+        )
 
 
 @router.post(
     "/{id_}/role",
     dependencies=[
         Depends(
-            permission_required(
-                Entity.User,
-                [Permission.Read, Permission.Update],
-            ),
-        ),
-        Depends(
-            permission_required(
-                Entity.Role,
-                [Permission.Read],
+            permissions_required(
+                {
+                    Entity.User: [Permission.Read, Permission.Update],
+                    Entity.Role: [Permission.Read],
+                },
             ),
         ),
     ],
@@ -174,7 +193,7 @@ async def add_roles(
 
     roles = await role_service.get_many(session, role_ids)
 
-    if len(roles) != len(role_ids):
+    if roles.missing:
         raise HTTPException(
             detail="Role not found",
             status_code=status.HTTP_404_NOT_FOUND,
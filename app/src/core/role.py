@@ -1,4 +1,5 @@
-from enum import Enum
+from enum import Enum, IntFlag, auto
+from typing import Iterable
 
 
 class Entity(str, Enum):
@@ -15,3 +16,20 @@ class Permission(str, Enum):
     Update = "Update"
     Delete = "Delete"
     ALL = "ALL"
+
+
+class PermissionMask(IntFlag):
+    Read = auto()
+    Create = auto()
+    Update = auto()
+    Delete = auto()
+    ALL = Read | Create | Update | Delete
+
+
+def permission_mask(permissions: Iterable[Permission | str]) -> PermissionMask:
+    mask = PermissionMask(0)
+    for permission in permissions:
+        name = Permission(permission).value
+        mask |= PermissionMask[name]
+
+    return mask
@@ -1,5 +1,11 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
 from jose import jwt
 from passlib.context import CryptContext
+from pydantic import BaseModel, Field
 from src.core.settings import settings
 
 SECRET_KEY = settings.SECRET_KEY
@@ -8,6 +14,8 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+_T = TypeVar("_T")
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return _pwd_context.verify(plain_password, hashed_password)
@@ -17,6 +25,89 @@ def get_password_hash(password: str) -> str:
     return _pwd_context.hash(password)
 
 
+class PasswordPoolFull(Exception):
+    pass
+
+
+class PasswordPoolStats(BaseModel):
+    queued: int = Field(default=0)
+    running: int = Field(default=0)
+    completed: int = Field(default=0)
+    rejected: int = Field(default=0)
+    # seconds from submission to result, queueing included
+    last_latency: float = Field(default=0)
+    avg_latency: float = Field(default=0)
+    max_latency: float = Field(default=0)
+
+
+class PasswordPool:
+    _executor: ThreadPoolExecutor
+    _slots: asyncio.Semaphore
+    _queue_size: int
+
+    def __init__(self, workers: int, queue_size: int) -> None:
+        # bcrypt releases the GIL while hashing, threads run in parallel
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="password",
+        )
+        self._slots = asyncio.Semaphore(workers)
+        self._queue_size = queue_size
+
+        self.stats = PasswordPoolStats()
+
+    async def _run(self, fn: Callable[..., _T], *args) -> _T:
+        if self.stats.queued >= self._queue_size:
+            self.stats.rejected += 1
+            raise PasswordPoolFull
+
+        started = time.monotonic()
+
+        self.stats.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.stats.queued -= 1
+
+        self.stats.running += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                fn,
+                *args,
+            )
+        finally:
+            self.stats.running -= 1
+            self._slots.release()
+
+        latency = time.monotonic() - started
+        self.stats.completed += 1
+        self.stats.last_latency = latency
+        if self.stats.completed == 1:
+            # an average seeded with 0 would under-report the first calls
+            self.stats.avg_latency = latency
+        else:
+            self.stats.avg_latency += (latency - self.stats.avg_latency) * 0.1
+        self.stats.max_latency = max(self.stats.max_latency, latency)
+
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_pool = PasswordPool(
+    workers=settings.PASSWORD_POOL_WORKERS,
+    queue_size=settings.PASSWORD_POOL_QUEUE_SIZE,
+)
+
+
 def jwt_encode(data: dict) -> str:
     return jwt.encode(data, SECRET_KEY, algorithm=ALGORITHM)
 
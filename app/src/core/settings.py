@@ -17,6 +17,27 @@ class Settings(BaseSettings):
 
     SECRET_KEY: str = Field(default_factory=token_bytes(16).hex)
     TOKEN_LIFETIME: float = 60 * 60 * 24
+    # authorize from permissions carried in the token instead of the database
+    TOKEN_EMBED_PERMISSIONS: bool = False
+    TOKEN_CACHE_MAXSIZE: int = 10_000
+
+    PASSWORD_POOL_WORKERS: int = 4
+    # logins waiting for a worker beyond this are answered with 503
+    PASSWORD_POOL_QUEUE_SIZE: int = 64
+
+    CACHE_VALIDATION_INTERVAL: float = 1.0
+
+    CACHE_BUS_ENABLED: bool = True
+    CACHE_BUS_CHANNEL: str = "shopper_cache"
+    CACHE_BUS_RECONNECT_INTERVAL: float = 5.0
+
+    PROVIDER_CACHE_MAXSIZE: int = 10_000
+    PROVIDER_CACHE_TTL: float = 60.0
+    PROVIDER_CACHE_NEGATIVE_TTL: float = 5.0
+
+    PRODUCT_EXPORT_FETCH_SIZE: int = 1000
+
+    BATCH_MAX_IDS: int = 1000
 
     @property
     def POSTGRES_DSN(self) -> str:
@@ -29,5 +50,16 @@ class Settings(BaseSettings):
             path=f"/{self.DB_NAME}",
         )
 
+    @property
+    def POSTGRES_LIBPQ_DSN(self) -> str:
+        return PostgresDsn.build(
+            scheme="postgresql",
+            host=self.DB_HOST,
+            port=self.DB_PORT,
+            user=self.DB_USER,
+            password=self.DB_PASSWORD,
+            path=f"/{self.DB_NAME}",
+        )
+
 
 settings = Settings()
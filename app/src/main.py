@@ -1,11 +1,40 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 from src.api import router as api_router
+from src.core.security import PasswordPoolFull, password_pool
+from src.core.settings import settings
+from src.services import invalidation_bus
 
 app = FastAPI(title="ShopperCMS API")
 
 app.include_router(api_router, prefix="/api")
 
 
+@app.exception_handler(PasswordPoolFull)
+async def password_pool_full(_: Request, __: PasswordPoolFull) -> JSONResponse:
+    return JSONResponse(
+        {"detail": "Too many password operations, retry later"},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.on_event("startup")
+async def start_invalidation_bus() -> None:
+    if settings.CACHE_BUS_ENABLED:
+        invalidation_bus.start()
+
+
+@app.on_event("shutdown")
+async def stop_invalidation_bus() -> None:
+    await invalidation_bus.stop()
+
+
+@app.on_event("shutdown")
+async def stop_password_pool() -> None:
+    password_pool.shutdown()
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -1,3 +1,19 @@
-from .models import Category, Product, Role, User, UserRole
+from .models import (
+    CacheVersion,
+    Category,
+    Product,
+    Role,
+    User,
+    UserRole,
+    product_search_vector,
+)
 
-__all__ = ["User", "Category", "Product", "Role", "UserRole"]
+__all__ = [
+    "User",
+    "Category",
+    "Product",
+    "Role",
+    "UserRole",
+    "CacheVersion",
+    "product_search_vector",
+]
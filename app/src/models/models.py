@@ -3,7 +3,16 @@ from __future__ import annotations
 from dataclasses import InitVar
 from typing import Optional
 
-from sqlalchemy import ForeignKey, MetaData, select
+from sqlalchemy import (
+    BigInteger,
+    ColumnElement,
+    ForeignKey,
+    Index,
+    MetaData,
+    func,
+    select,
+    text,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import DeclarativeBase, Mapped, MappedAsDataclass, mapped_column
 from src.core.security import get_password_hash
@@ -16,6 +25,7 @@ from src.models._types import (
     timestamp_now,
     ulid,
     ulid_pk,
+    varchar50,
     varchar255,
 )
 
@@ -43,20 +53,29 @@ class User(Base):
     username: Mapped[varchar255] = mapped_column(nullable=False, unique=True)
     email: Mapped[varchar255] = mapped_column(nullable=False, unique=True)
 
-    # Init Only
-    password: InitVar[str]
+    # Init Only, hashed in place; pass password_hash to hash it elsewhere
+    password: InitVar[str | None] = None
 
-    password_hash: Mapped[sha256] = mapped_column(init=False)
+    password_hash: Mapped[sha256] = mapped_column(default=None)
 
     created_at: Mapped[timestamp] = mapped_column(init=False)
     updated_at: Mapped[timestamp_now] = mapped_column(init=False)
 
-    def __post_init__(self, password: str):
-        self.password_hash = get_password_hash(password)
+    def __post_init__(self, password: str | None):
+        if password is not None:
+            self.password_hash = get_password_hash(password)
 
 
 class Category(Base):
     __tablename__ = "category"
+    __table_args__ = (
+        Index(
+            "ix__category__metadata",
+            "metadata",
+            postgresql_using="gin",
+            postgresql_ops={"metadata": "jsonb_path_ops"},
+        ),
+    )
 
     id_: Mapped[ulid_pk] = mapped_column("id", init=False)
     name: Mapped[varchar255]
@@ -93,6 +112,24 @@ class Category(Base):
 
 class Product(Base):
     __tablename__ = "product"
+    __table_args__ = (
+        # keyset pagination orders by (<sort key>, id)
+        Index("ix__product__name_id", "name", "id"),
+        Index("ix__product__price_id", "price", "id"),
+        Index("ix__product__category_id_id", "category_id", "id"),
+        Index(
+            "ix__product__metadata",
+            "metadata",
+            postgresql_using="gin",
+            postgresql_ops={"metadata": "jsonb_path_ops"},
+        ),
+        Index(
+            "ix__product__name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+    )
 
     id_: Mapped[ulid_pk] = mapped_column("id", init=False)
     name: Mapped[varchar255]
@@ -118,6 +155,32 @@ class Product(Base):
         return await session.get(Category, self.parent_id)
 
 
+def _product_search_vector() -> ColumnElement:
+    # constants are inlined, the planner only picks ix__product__search
+    # when the query repeats the indexed expression verbatim
+    config = text("'simple'::regconfig")
+    table = Product.__table__
+
+    return func.setweight(
+        func.to_tsvector(config, table.c.name),
+        text("'A'"),
+    ).op("||")(
+        func.setweight(
+            func.jsonb_to_tsvector(
+                config,
+                func.coalesce(table.c.metadata, text("'{}'::jsonb")),
+                text("'[\"string\"]'::jsonb"),
+            ),
+            text("'B'"),
+        ),
+    )
+
+
+product_search_vector = _product_search_vector()
+
+Index("ix__product__search", product_search_vector, postgresql_using="gin")
+
+
 class Role(Base):
     __tablename__ = "role"
 
@@ -131,3 +194,10 @@ class UserRole(Base):
 
     user_id: Mapped[ulid] = mapped_column(ForeignKey("user.id"), primary_key=True)
     role_id: Mapped[ulid] = mapped_column(ForeignKey("role.id"), primary_key=True)
+
+
+class CacheVersion(Base):
+    __tablename__ = "cache_version"
+
+    name: Mapped[varchar50] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=0)
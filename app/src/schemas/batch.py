@@ -0,0 +1,11 @@
+from typing import Generic, TypeVar
+
+from pydantic.generics import GenericModel
+
+_T = TypeVar("_T")
+
+
+class Batch(GenericModel, Generic[_T]):
+    items: list[_T]
+    # requested ids that do not exist or are not valid ids
+    missing: list[str]
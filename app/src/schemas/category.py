@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import TypeAlias
+from typing import Any, TypeAlias
 
 from pydantic import BaseModel, Field
 
@@ -19,9 +19,26 @@ class UpdateCategory(BaseModel):
     metadata: _T_Metadata | None
 
 
+class CategoryNode(BaseModel):
+    id_: str
+    name: str
+    parent_id: str | None
+    metadata: _T_Metadata | None
+
+
 class Category(BaseModel):
     id_: str
     name: str
     parent_id: str | None
     metadata: _T_Metadata | None
     sub_categories: list[Category] = Field(default_factory=list)
+    # set only on nodes whose sub_categories were cut off by a depth limit
+    sub_categories_count: int | None = None
+
+    def dict(self, **kwargs: Any) -> dict[str, Any]:
+        data = super().dict(**kwargs)
+        # left out of the payload everywhere else
+        if data.get("sub_categories_count") is None:
+            data.pop("sub_categories_count", None)
+
+        return data
@@ -0,0 +1,8 @@
+from typing import Any
+
+from pydantic import BaseModel, Field
+
+
+class MetadataFilter(BaseModel):
+    contains: list[dict[str, Any]] = Field(default_factory=list)
+    has_keys: list[str] = Field(default_factory=list)
@@ -1,6 +1,8 @@
+from enum import Enum
 from typing import TypeAlias
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from src.schemas.filters import MetadataFilter
 
 _T_Metadata: TypeAlias = dict[str, str | bool | int | float | None]
 
@@ -25,3 +27,73 @@ class Product(BaseModel):
     price: float
     category_id: str | None
     metadata: _T_Metadata | None
+
+
+class ProductSort(str, Enum):
+    id_ = "id"
+    name = "name"
+    price = "price"
+
+
+class ProductPage(BaseModel):
+    items: list[Product]
+    next_cursor: str | None
+
+
+class ProductSearchHit(Product):
+    score: float
+
+
+class ProductSearchPage(BaseModel):
+    items: list[ProductSearchHit]
+    next_cursor: str | None
+
+
+class ProductSuggestion(BaseModel):
+    id_: str
+    name: str
+
+
+class UpsertProduct(BaseModel):
+    id_: str | None
+    name: str
+    price: float
+    category_id: str | None
+    metadata: _T_Metadata | None
+
+
+class UpsertStatus(str, Enum):
+    created = "created"
+    updated = "updated"
+    failed = "failed"
+
+
+class UpsertProductResult(BaseModel):
+    index: int
+    status: UpsertStatus
+    product: Product | None
+    detail: str | None
+
+
+class ProductFilter(BaseModel):
+    category_ids: list[str] | None
+    metadata: MetadataFilter | None
+    price_min: float | None
+    price_max: float | None
+
+
+class PriceBucket(BaseModel):
+    price_from: float
+    price_to: float
+    count: int
+
+
+class CategoryFacet(BaseModel):
+    category_id: str | None
+    count: int
+
+
+class ProductFacets(BaseModel):
+    total: int
+    price: list[PriceBucket] = Field(default_factory=list)
+    categories: list[CategoryFacet] = Field(default_factory=list)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from src.core.role import Entity, Permission
+from src.core.role import Entity, Permission, PermissionMask
 
 
 class CreateRole(BaseModel):
@@ -16,3 +16,13 @@ class Role(BaseModel):
     id_: str
     name: str
     permissions: dict[Entity, list[Permission]]
+
+
+class UserPermissions(BaseModel):
+    # entity name -> PermissionMask bits, merged over all roles of the user
+    masks: dict[str, int]
+
+    def allows(self, entity: Entity, required: PermissionMask) -> bool:
+        granted = self.masks.get(entity.value, 0) | self.masks.get(Entity.ANY.value, 0)
+
+        return required & granted == required
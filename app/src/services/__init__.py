@@ -1,6 +1,15 @@
 from .category import category_service
+from .invalidation import invalidation_bus
+from .permission import permission_service
 from .product import product_service
 from .role import role_service
 from .user import user_service
 
-__all__ = ["category_service", "product_service", "role_service", "user_service"]
+__all__ = [
+    "category_service",
+    "product_service",
+    "role_service",
+    "user_service",
+    "invalidation_bus",
+    "permission_service",
+]
@@ -0,0 +1,151 @@
+import time
+from collections import OrderedDict
+from typing import Any, Generic, NamedTuple, TypeVar
+
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .protocol import IProvider
+
+_T = TypeVar("_T")
+
+
+class CacheStats(BaseModel):
+    hits: int = Field(default=0)
+    misses: int = Field(default=0)
+    evictions: int = Field(default=0)
+
+
+class _Entry(NamedTuple):
+    value: Any
+    expires: float
+
+
+class CachedProvider(Generic[_T]):
+    _provider: IProvider[_T]
+    _entries: OrderedDict[Any, _Entry]
+    _all: _Entry | None
+    _generation: int
+
+    def __init__(
+        self,
+        provider: IProvider[_T],
+        maxsize: int,
+        ttl: float,
+        negative_ttl: float | None = None,
+        cache_all: bool = True,
+    ) -> None:
+        self._provider = provider
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._cache_all = cache_all
+
+        self._entries = OrderedDict()
+        self._all = None
+        self._generation = 0
+
+        self.stats = CacheStats()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, id_: Any) -> _Entry | None:
+        entry = self._entries.get(id_)
+        if not entry:
+            return None
+
+        if entry.expires <= time.monotonic():
+            del self._entries[id_]
+            return None
+
+        self._entries.move_to_end(id_)
+
+        return entry
+
+    def _store(self, id_: Any, value: _T | None) -> None:
+        ttl = self._ttl if value is not None else self._negative_ttl
+        if not ttl:
+            return
+
+        self._entries[id_] = _Entry(value, time.monotonic() + ttl)
+        self._entries.move_to_end(id_)
+
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def get(self, session: AsyncSession, id_: Any) -> _T | None:
+        entry = self._lookup(id_)
+        if entry:
+            self.stats.hits += 1
+            return entry.value
+
+        self.stats.misses += 1
+
+        generation = self._generation
+        value = await self._provider.get(session, id_)
+
+        # do not resurrect a value that was invalidated while we were loading it
+        if generation == self._generation:
+            self._store(id_, value)
+
+        return value
+
+    async def get_many(self, session: AsyncSession, ids: list[Any]) -> dict[Any, _T]:
+        found = {}
+        misses = []
+        for id_ in dict.fromkeys(ids):
+            entry = self._lookup(id_)
+            if not entry:
+                misses.append(id_)
+                continue
+
+            self.stats.hits += 1
+            if entry.value is not None:
+                found[id_] = entry.value
+
+        if not misses:
+            return found
+
+        self.stats.misses += len(misses)
+
+        generation = self._generation
+        values = await self._provider.get_many(session, misses)
+
+        if generation == self._generation:
+            for id_ in misses:
+                self._store(id_, values.get(id_))
+
+        found.update(values)
+
+        return found
+
+    async def get_all(self, session: AsyncSession) -> list[_T]:
+        if not self._cache_all:
+            return await self._provider.get_all(session)
+
+        if self._all and self._all.expires > time.monotonic():
+            self.stats.hits += 1
+            return list(self._all.value)
+
+        self.stats.misses += 1
+
+        generation = self._generation
+        values = await self._provider.get_all(session)
+
+        if generation == self._generation:
+            self._all = _Entry(values, time.monotonic() + self._ttl)
+
+        return list(values)
+
+    def invalidate_key(self, id_: Any) -> None:
+        self._entries.pop(id_, None)
+        self._all = None
+        # a load of this key may be in flight, keep it from being stored
+        self._generation += 1
+
+    def invalidate(self) -> None:
+        self._entries.clear()
+        self._all = None
+        self._generation += 1
@@ -1,115 +1,436 @@
-from datetime import datetime
-from typing import TypeAlias, TypeVar
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Iterable, TypeAlias, TypeVar, cast
 
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, Field
-from sqlalchemy import delete, func, select
+from sqlalchemy import CursorResult, delete, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.db import engine
+from src.core.settings import settings
+from src.models import CacheVersion as CacheVersionModel
 from src.models import Category as CategoryModel
-from src.schemas.category import Category, CreateCategory, UpdateCategory
-
-from .protocol import ICachedProvider, IProvider
-from .utils import Some, reserved_name_transformer
+from src.schemas.batch import Batch
+from src.schemas.category import Category, CategoryNode, CreateCategory, UpdateCategory
+from src.schemas.filters import MetadataFilter
+
+from .invalidation import invalidation_bus
+from .protocol import ICachedTreeProvider, IEncodedProvider, ITreeCache, ITreeProvider
+from .utils import (
+    Some,
+    canonical_id,
+    make_batch,
+    metadata_clauses,
+    reserved_name_transformer,
+    uuid_keys,
+)
 
 _T = TypeVar("_T")
-_AnyProvider: TypeAlias = IProvider[_T] | ICachedProvider[_T]
+_AnyProvider: TypeAlias = ITreeProvider[_T] | ICachedTreeProvider[_T]
+
+
+async def _get_version(session: AsyncSession) -> int:
+    version = await session.scalar(
+        select(CacheVersionModel.version).where(
+            CacheVersionModel.name == CategoryModel.__tablename__,
+        ),
+    )
+
+    return version or 0
+
+
+def _category_to_node(category: Category) -> CategoryNode:
+    return CategoryNode(
+        id_=category.id_,
+        name=category.name,
+        parent_id=category.parent_id,
+        metadata=category.metadata,
+    )
+
+
+def _encode(categories: list[Category]) -> bytes:
+    # same encoding as fastapi's JSONResponse
+    return json.dumps(
+        jsonable_encoder(categories),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def _cut_tree(category: Category, depth: int) -> Category:
+    node = Category(
+        id_=category.id_,
+        name=category.name,
+        parent_id=category.parent_id,
+        metadata=category.metadata,
+    )
+
+    if depth > 0:
+        node.sub_categories = [
+            _cut_tree(sub_category, depth - 1)
+            for sub_category in category.sub_categories
+        ]
+    elif category.sub_categories:
+        node.sub_categories_count = len(category.sub_categories)
+
+    return node
+
+
+def _detach(parent: Category, category: Category) -> None:
+    # list.remove() compares by value, which dumps every sibling's subtree
+    parent.sub_categories[:] = [
+        sub_category
+        for sub_category in parent.sub_categories
+        if sub_category is not category
+    ]
+
+
+def _project_category(category: Category, fields: list[str]) -> dict[str, Any]:
+    result = {field: getattr(category, field) for field in fields}
+    # tree structure is kept whatever fields were asked for
+    result["sub_categories"] = [
+        _project_category(sub_category, fields)
+        for sub_category in category.sub_categories
+    ]
+    if category.sub_categories_count is not None:
+        result["sub_categories_count"] = category.sub_categories_count
+
+    return result
 
 
 class _CacheMeta(BaseModel):
-    count: int = Field(default=0)
-    last_update: datetime = Field(default_factory=lambda: datetime.fromtimestamp(0))
+    version: int = Field(default=0)
+    checked_at: float = Field(default=0)
+
+
+class _TreeIndex:
+    parents: dict[str, str | None]
+    depths: dict[str, int]
+    entries: dict[str, int]
+    exits: dict[str, int]
+    order: list[Category]
+
+    def __init__(self, roots: Iterable[Category]) -> None:
+        self.parents = {}
+        self.depths = {}
+        self.entries = {}
+        self.exits = {}
+        self.order = []
+
+        # Euler tour: a subtree occupies order[entries[id_]:exits[id_]]
+        stack: list[tuple[Category, bool]] = [
+            (root, False) for root in reversed(list(roots))
+        ]
+        while stack:
+            category, leaving = stack.pop()
+            if leaving:
+                self.exits[category.id_] = len(self.order)
+                continue
+
+            self.parents[category.id_] = category.parent_id
+            self.depths[category.id_] = (
+                self.depths[category.parent_id] + 1 if category.parent_id else 0
+            )
+            self.entries[category.id_] = len(self.order)
+            self.order.append(category)
+
+            stack.append((category, True))
+            stack.extend((child, False) for child in reversed(category.sub_categories))
+
+    def ancestors(self, id_: str) -> list[Category]:
+        ancestors = []
+
+        parent_id = self.parents[id_]
+        while parent_id:
+            ancestors.append(self.order[self.entries[parent_id]])
+            parent_id = self.parents[parent_id]
+
+        return ancestors[::-1]
+
+    def descendants(self, id_: str) -> list[Category]:
+        return self.order[self.entries[id_] + 1 : self.exits[id_]]
+
+    def is_descendant(self, id_: str, ancestor_id: str) -> bool:
+        return self.entries[ancestor_id] < self.entries[id_] < self.exits[ancestor_id]
 
 
 class _InMemoryCategoryProvider:
     __cache: dict[str, Category]
     __cache_meta: _CacheMeta | None
+    __index: _TreeIndex | None
+    __encoded: tuple[bytes, str] | None
+    __generation: int
+    __rebuild: asyncio.Task | None
 
     def __init__(self):
         self.__cache = {}
         self.__cache_meta = None
+        self.__index = None
+        self.__encoded = None
+        self.__generation = 0
+        self.__rebuild = None
 
     async def _validate_cache(self, session: AsyncSession) -> bool:
-        valid = True
-
         if not self.__cache_meta:
-            valid = False
-            self.__cache_meta = _CacheMeta()
+            return False
 
-        count: int = (
-            await session.execute(select(func.count()).select_from(CategoryModel))
-        ).scalar_one()
+        now = time.monotonic()
 
-        if count != self.__cache_meta.count:
-            self.__cache_meta.count = count
-            valid = False
+        # while the bus is listening every write reaches invalidate() directly
+        if (
+            invalidation_bus.connected
+            or now - self.__cache_meta.checked_at < settings.CACHE_VALIDATION_INTERVAL
+        ):
+            return True
 
-        last_update = (
-            await session.execute(
-                select(CategoryModel.updated_at)
-                .order_by(CategoryModel.updated_at.desc())
-                .limit(1),
-            )
-        ).scalar_one()
+        cache_meta = self.__cache_meta
+        if await _get_version(session) != cache_meta.version:
+            return False
 
-        if last_update != self.__cache_meta.last_update:
-            self.__cache_meta.last_update = last_update
-            valid = False
+        cache_meta.checked_at = now
 
-        return valid
+        return True
 
     async def _init_cache(self, session: AsyncSession) -> None:
-        self.__cache.clear()
+        generation = self.__generation
+        # one snapshot for both reads: a write committed between them would
+        # be in the rows but not the version, and advance() would apply it again
+        await session.connection(
+            execution_options={"isolation_level": "REPEATABLE READ"},
+        )
+        version = await _get_version(session)
 
-        session.expunge_all()
-        category_objects: list[CategoryModel] = (
-            await session.scalars(select(CategoryModel))
+        rows = (
+            await session.execute(
+                select(
+                    CategoryModel.id_,
+                    CategoryModel.name,
+                    CategoryModel.parent_id,
+                    CategoryModel.metadata_,
+                ),
+            )
         ).all()
 
-        async def _traverse_root(root: Category) -> list[Category]:
-            stack: list[Category] = []
-
-            async def _dfs(c: CategoryModel):
-                stack.append(
-                    Category(
-                        id_=c.id_.hex,
-                        name=c.name,
-                        metadata=c.metadata_,
-                        parent_id=c.parent_id.hex if c.parent_id else None,
-                    ),
-                )
-                nested_cats = []
-                for child_cat in await c.get_children(session):
-                    nested_cats.extend(await _dfs(child_cat))
+        nodes: dict[str, Category] = {}
+        children: dict[str | None, list[Category]] = {}
+        for id_, name, parent_id, metadata in rows:
+            category = Category(
+                id_=id_.hex,
+                name=name,
+                metadata=metadata,
+                parent_id=parent_id.hex if parent_id else None,
+            )
+            nodes[category.id_] = category
+            children.setdefault(category.parent_id, []).append(category)
+
+        for parent_id, sub_categories in children.items():
+            if parent_id in nodes:
+                nodes[parent_id].sub_categories.extend(sub_categories)
+
+        # pre-order walk keeps every tree contiguous: root, then its subtree
+        cache: dict[str, Category] = {}
+        stack = list(reversed(children.get(None, [])))
+        while stack:
+            category = stack.pop()
+            cache[category.id_] = category
+            stack.extend(reversed(category.sub_categories))
+
+        self.__index = _TreeIndex(children.get(None, []))
+        self.__encoded = None
+        self.__cache = cache
+        # an invalidation that raced the rebuild may not be reflected in it
+        if generation == self.__generation:
+            self.__cache_meta = _CacheMeta(version=version, checked_at=time.monotonic())
+
+    async def _rebuild_cache(self) -> None:
+        # shared by all waiters and may outlive the request that started it,
+        # so it cannot borrow that request's session
+        async with AsyncSession(engine) as session:
+            await self._init_cache(session)
 
-                cat_tree = stack.pop()
-                if stack:
-                    stack[-1].sub_categories.append(cat_tree)
+    def _rebuild_done(self, _: asyncio.Task) -> None:
+        self.__rebuild = None
 
-                return [cat_tree, *nested_cats]
+    async def _get_cache(self, session: AsyncSession) -> dict[str, Category]:
+        if not self.__rebuild and await self._validate_cache(session):
+            return self.__cache
 
-            return await _dfs(root)
+        if not self.__rebuild:
+            self.__rebuild = asyncio.create_task(self._rebuild_cache())
+            self.__rebuild.add_done_callback(self._rebuild_done)
 
-        for category_object in category_objects:
-            if category_object.parent_id is not None:
-                continue
+        # a cancelled caller must not cancel the rebuild other callers await
+        await asyncio.shield(self.__rebuild)
 
-            categories = await _traverse_root(category_object)
-
-            self.__cache.update(dict(map(lambda cat: (cat.id_, cat), categories)))
+        return self.__cache
 
     async def get_all(self, session: AsyncSession) -> list[Category]:
-        if not await self._validate_cache(session):
-            await self._init_cache(session)
+        cache = await self._get_cache(session)
 
-        return list(self.__cache.values())
+        return list(cache.values())
 
     async def get(self, session: AsyncSession, id_: str) -> Category | None:
-        if not await self._validate_cache(session):
-            await self._init_cache(session)
+        cache = await self._get_cache(session)
+
+        return cache.get(id_, None)
+
+    async def get_many(
+        self,
+        session: AsyncSession,
+        ids: list[str],
+    ) -> dict[str, Category]:
+        cache = await self._get_cache(session)
+
+        return {
+            id_: cache[key.hex]
+            for key, id_ in uuid_keys(ids).items()
+            if key.hex in cache
+        }
+
+    async def _get_index(self, session: AsyncSession) -> _TreeIndex:
+        cache = await self._get_cache(session)
+
+        # patches drop the index; rebuilding it is in-memory only
+        if not self.__index:
+            self.__index = _TreeIndex(
+                category for category in cache.values() if not category.parent_id
+            )
+
+        return self.__index
+
+    async def get_encoded(self, session: AsyncSession) -> tuple[bytes, str]:
+        cache = await self._get_cache(session)
+
+        if not self.__encoded:
+            roots = [category for category in cache.values() if not category.parent_id]
+            content = _encode(roots)
+            self.__encoded = content, f'"{hashlib.sha256(content).hexdigest()}"'
 
-        return self.__cache.get(id_, None)
+        return self.__encoded
+
+    async def get_ancestors(
+        self,
+        session: AsyncSession,
+        id_: str,
+    ) -> list[Category] | None:
+        index = await self._get_index(session)
+        if id_ not in index.entries:
+            return None
+
+        return index.ancestors(id_)
+
+    async def get_descendants(
+        self,
+        session: AsyncSession,
+        id_: str,
+    ) -> list[Category] | None:
+        index = await self._get_index(session)
+        if id_ not in index.entries:
+            return None
+
+        return index.descendants(id_)
+
+    async def is_descendant(
+        self,
+        session: AsyncSession,
+        id_: str,
+        ancestor_id: str,
+    ) -> bool:
+        index = await self._get_index(session)
+        if id_ not in index.entries or ancestor_id not in index.entries:
+            return False
+
+        return index.is_descendant(id_, ancestor_id)
 
     def invalidate(self) -> None:
         self.__cache_meta = None
+        self.__generation += 1
+
+    def advance(self, version: int) -> bool:
+        if not self.__cache_meta or self.__cache_meta.version + 1 != version:
+            self.invalidate()
+            return False
+
+        self.__cache_meta.version = version
+
+        return True
+
+    def insert(self, node: Category) -> None:
+        self.__index = None
+        self.__encoded = None
+
+        if node.id_ in self.__cache:
+            self.invalidate()
+            return
+
+        if node.parent_id:
+            parent = self.__cache.get(node.parent_id)
+            if not parent:
+                self.invalidate()
+                return
+
+            parent.sub_categories.append(node)
+
+        self.__cache[node.id_] = node
+
+    def edit(self, id_: str, **fields) -> None:
+        self.__encoded = None
+
+        category = self.__cache.get(id_)
+        if not category:
+            self.invalidate()
+            return
+
+        for k, v in fields.items():
+            setattr(category, k, v)
+
+    def move(self, id_: str, parent_id: str | None) -> None:
+        self.__index = None
+        self.__encoded = None
+
+        category = self.__cache.get(id_)
+        parent = self.__cache.get(parent_id) if parent_id else None
+        if not category or (parent_id and not parent):
+            self.invalidate()
+            return
+
+        ancestor = parent
+        while ancestor:
+            if ancestor.id_ == id_:
+                # the database now holds a cycle, let the rebuild sort it out
+                self.invalidate()
+                return
+
+            ancestor = self.__cache.get(ancestor.parent_id or "")
+
+        if category.parent_id:
+            _detach(self.__cache[category.parent_id], category)
+
+        category.parent_id = parent_id
+        if parent:
+            parent.sub_categories.append(category)
+
+    def remove(self, id_: str) -> None:
+        self.__index = None
+        self.__encoded = None
+
+        category = self.__cache.get(id_)
+        if not category:
+            self.invalidate()
+            return
+
+        if category.parent_id:
+            _detach(self.__cache[category.parent_id], category)
+
+        stack = [category]
+        while stack:
+            category = stack.pop()
+            self.__cache.pop(category.id_, None)
+            stack.extend(category.sub_categories)
 
 
 class CategoryService:
@@ -118,15 +439,139 @@ class CategoryService:
     def __init__(self, category_provider: _AnyProvider[Category]) -> None:
         self._provider = category_provider
 
-    async def get_all(self, session: AsyncSession) -> list[Category]:
-        categories = await self._provider.get_all(session)
-        root_only_filter = filter(lambda cat: not cat.parent_id, categories)
+        if isinstance(self._provider, ICachedTreeProvider):
+            invalidation_bus.subscribe(CategoryModel.__tablename__, self._provider)
 
-        return list(root_only_filter)
+    async def get_all(
+        self,
+        session: AsyncSession,
+        depth: int | None = None,
+        root_id: str | None = None,
+        metadata: MetadataFilter | None = None,
+    ) -> list[Category] | None:
+        if root_id:
+            root = await self._provider.get(session, root_id)
+            if not root:
+                return None
+
+            categories = [root]
+
+        if metadata:
+            # the index finds the ids, the trees still come from the cache
+            ids = (
+                await session.scalars(
+                    select(CategoryModel.id_).where(
+                        *metadata_clauses(CategoryModel.metadata_, metadata),
+                    ),
+                )
+            ).all()
+
+            categories = []
+            for id_ in ids:
+                category = await self._provider.get(session, id_.hex)
+                if not category:
+                    continue
+
+                if root_id and not (
+                    category.id_ == root_id
+                    or await self._provider.is_descendant(
+                        session,
+                        category.id_,
+                        root_id,
+                    )
+                ):
+                    continue
+
+                categories.append(category)
+
+            # matches are listed flat, their subtrees hold non-matching
+            # nodes and matches that are already in the list
+            return [_cut_tree(category, 0) for category in categories]
+
+        if not root_id:
+            categories = await self._provider.get_all(session)
+            categories = list(filter(lambda cat: not cat.parent_id, categories))
+
+        if depth is None:
+            return categories
+
+        return [_cut_tree(category, depth) for category in categories]
+
+    async def get_all_fields(
+        self,
+        session: AsyncSession,
+        fields: list[str],
+        depth: int | None = None,
+        root_id: str | None = None,
+        metadata: MetadataFilter | None = None,
+    ) -> list[dict[str, Any]] | None:
+        categories = await self.get_all(
+            session,
+            depth=depth,
+            root_id=root_id,
+            metadata=metadata,
+        )
+        if categories is None:
+            return None
+
+        return [_project_category(category, fields) for category in categories]
 
     async def get(self, session: AsyncSession, id_: str) -> Category | None:
         return await self._provider.get(session, id_)
 
+    async def get_many(self, session: AsyncSession, ids: list[str]) -> Batch[Category]:
+        return make_batch(ids, await self._provider.get_many(session, ids))
+
+    async def get_fields(
+        self,
+        session: AsyncSession,
+        id_: str,
+        fields: list[str],
+    ) -> dict[str, Any] | None:
+        category = await self._provider.get(session, id_)
+        if not category:
+            return None
+
+        return _project_category(category, fields)
+
+    async def get_all_encoded(self, session: AsyncSession) -> tuple[bytes, str]:
+        if isinstance(self._provider, IEncodedProvider):
+            return await self._provider.get_encoded(session)
+
+        content = _encode(Some(await self.get_all(session)))
+
+        return content, f'"{hashlib.sha256(content).hexdigest()}"'
+
+    async def get_ancestors(
+        self,
+        session: AsyncSession,
+        id_: str,
+    ) -> list[CategoryNode] | None:
+        ancestors = await self._provider.get_ancestors(session, id_)
+        if ancestors is None:
+            return None
+
+        return list(map(_category_to_node, ancestors))
+
+    async def get_descendants(
+        self,
+        session: AsyncSession,
+        id_: str,
+    ) -> list[CategoryNode] | None:
+        descendants = await self._provider.get_descendants(session, id_)
+        if descendants is None:
+            return None
+
+        return list(map(_category_to_node, descendants))
+
+    async def is_descendant(
+        self,
+        session: AsyncSession,
+        id_: str,
+        ancestor_id: str,
+    ) -> bool:
+        return await self._provider.is_descendant(session, id_, ancestor_id)
+
     async def create(
         self,
         session: AsyncSession,
@@ -139,9 +584,23 @@ class CategoryService:
         )
 
         session.add(category_obj)
+        await session.flush()
+        version = await _get_version(session)
+        await invalidation_bus.publish(session, CategoryModel.__tablename__)
         await session.commit()
 
-        if isinstance(self._provider, ICachedProvider):
+        if isinstance(self._provider, ITreeCache):
+            if self._provider.advance(version):
+                self._provider.insert(
+                    Category(
+                        id_=category_obj.id_.hex,
+                        name=create_category.name,
+                        parent_id=create_category.parent_id,
+                        metadata=create_category.metadata,
+                    ),
+                )
+
+        elif isinstance(self._provider, ICachedTreeProvider):
             self._provider.invalidate()
 
         category = Some(await self._provider.get(session, category_obj.id_.hex))
@@ -153,29 +612,69 @@ class CategoryService:
         session: AsyncSession,
         id_: str,
         update_category: UpdateCategory,
-    ) -> Category:
-        category_obj = await session.get(CategoryModel, id_)
+    ) -> Category | None:
+        category_id = canonical_id(id_)
+        if not category_id:
+            return None
+
+        fields = update_category.dict(exclude_none=True)
+        if not fields:
+            return await self._provider.get(session, category_id)
+
+        updated_id = await session.scalar(
+            update(CategoryModel)
+            .where(CategoryModel.id_ == category_id)
+            .values({reserved_name_transformer(k): v for k, v in fields.items()})
+            .returning(CategoryModel.id_),
+        )
 
-        for k, v in update_category.dict().items():
-            if v is not None:
-                setattr(category_obj, reserved_name_transformer(k), v)
+        if not updated_id:
+            await session.rollback()
+            return None
 
-        session.add(category_obj)
+        version = await _get_version(session)
+        await invalidation_bus.publish(session, CategoryModel.__tablename__)
         await session.commit()
 
-        if isinstance(self._provider, ICachedProvider):
+        if isinstance(self._provider, ITreeCache):
+            if self._provider.advance(version):
+                if "parent_id" in fields:
+                    self._provider.move(category_id, fields.pop("parent_id"))
+
+                self._provider.edit(category_id, **fields)
+
+        elif isinstance(self._provider, ICachedTreeProvider):
             self._provider.invalidate()
 
-        category = Some(await self._provider.get(session, id_))
+        category = Some(await self._provider.get(session, category_id))
 
         return category
 
-    async def delete(self, session: AsyncSession, id_: str) -> None:
-        await session.execute(delete(CategoryModel).where(CategoryModel.id_ == id_))
+    async def delete(self, session: AsyncSession, id_: str) -> bool:
+        category_id = canonical_id(id_)
+        if not category_id:
+            return False
+
+        result = await session.execute(
+            delete(CategoryModel).where(CategoryModel.id_ == category_id),
+        )
+
+        if not cast(CursorResult, result).rowcount:
+            await session.rollback()
+            return False
+
+        version = await _get_version(session)
+        await invalidation_bus.publish(session, CategoryModel.__tablename__)
         await session.commit()
 
-        if isinstance(self._provider, ICachedProvider):
+        if isinstance(self._provider, ITreeCache):
+            if self._provider.advance(version):
+                self._provider.remove(category_id)
+
+        elif isinstance(self._provider, ICachedTreeProvider):
             self._provider.invalidate()
 
+        return True
+
 
 category_service = CategoryService(category_provider=_InMemoryCategoryProvider())
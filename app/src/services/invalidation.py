@@ -0,0 +1,104 @@
+import asyncio
+import json
+import logging
+from contextlib import suppress
+from uuid import uuid4
+
+import psycopg
+from psycopg import sql
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.settings import settings
+
+from .protocol import ICache
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidationBus:
+    _channel: str
+    _source: str
+    _caches: dict[str, list[ICache]]
+    _task: asyncio.Task | None
+    _connected: bool
+
+    def __init__(self, channel: str) -> None:
+        self._channel = channel
+        self._source = uuid4().hex
+        self._caches = {}
+        self._task = None
+        self._connected = False
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    def subscribe(self, topic: str, cache: ICache) -> None:
+        self._caches.setdefault(topic, []).append(cache)
+
+    async def publish(self, session: AsyncSession, topic: str) -> None:
+        # NOTIFY is transactional: listeners receive it only after commit
+        payload = json.dumps({"source": self._source, "topic": topic})
+        await session.execute(select(func.pg_notify(self._channel, payload)))
+
+    def invalidate(self, topic: str | None = None) -> None:
+        topics = [topic] if topic else list(self._caches)
+
+        for t in topics:
+            for cache in self._caches.get(t, []):
+                cache.invalidate()
+
+    def _handle(self, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Malformed cache invalidation event: %r", payload)
+            return
+
+        # the publishing process has already updated its own caches
+        if event.get("source") == self._source:
+            return
+
+        self.invalidate(event.get("topic"))
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    settings.POSTGRES_LIBPQ_DSN,
+                    autocommit=True,
+                ) as conn:
+                    await conn.execute(
+                        sql.SQL("LISTEN {}").format(sql.Identifier(self._channel)),
+                    )
+                    self._connected = True
+                    # events published while we were not listening are lost
+                    self.invalidate()
+
+                    async for notify in conn.notifies():
+                        self._handle(notify.payload)
+
+            except Exception:
+                logger.exception("Cache invalidation listener failed")
+
+            finally:
+                self._connected = False
+
+            await asyncio.sleep(settings.CACHE_BUS_RECONNECT_INTERVAL)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+
+        self._task = None
+
+
+invalidation_bus = InvalidationBus(channel=settings.CACHE_BUS_CHANNEL)
@@ -0,0 +1,164 @@
+import uuid
+from collections import defaultdict
+from typing import Any, TypeAlias, TypeVar
+
+from sqlalchemy import ColumnElement, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.role import permission_mask
+from src.core.settings import settings
+from src.models import CacheVersion as CacheVersionModel
+from src.models import Role as RoleModel
+from src.models import User as UserModel
+from src.models import UserRole as UserRoleModel
+from src.schemas.role import UserPermissions
+
+from .cache import CachedProvider
+from .invalidation import invalidation_bus
+from .protocol import ICachedProvider, IKeyedCache, IProvider
+from .utils import any_of, uuid_keys
+
+_T = TypeVar("_T")
+_AnyProvider: TypeAlias = IProvider[_T] | ICachedProvider[_T]
+
+_PERMISSION_VERSION = "permission"
+
+
+def _compile(role_permissions: list[dict[str, Any]]) -> UserPermissions:
+    masks: dict[str, int] = defaultdict(int)
+    # union over all roles, a role never takes away what another one grants
+    for permissions in role_permissions:
+        for entity, names in permissions.items():
+            masks[entity] |= permission_mask(names)
+
+    return UserPermissions(masks={entity: int(mask) for entity, mask in masks.items()})
+
+
+class _PermissionProvider:
+    async def _load(
+        self,
+        session: AsyncSession,
+        *where: ColumnElement[bool],
+    ) -> dict[uuid.UUID, UserPermissions]:
+        rows = await session.execute(
+            select(UserRoleModel.user_id, RoleModel.permissions)
+            .join(RoleModel, UserRoleModel.role_id == RoleModel.id_)
+            .where(*where),
+        )
+
+        grouped: dict[uuid.UUID, list[dict[str, Any]]] = defaultdict(list)
+        for user_id, permissions in rows:
+            grouped[user_id].append(permissions or {})
+
+        return {
+            user_id: _compile(permissions) for user_id, permissions in grouped.items()
+        }
+
+    async def get(self, session: AsyncSession, id_: str) -> UserPermissions | None:
+        permissions = await self.get_many(session, [id_])
+
+        return permissions.get(id_)
+
+    async def get_all(self, session: AsyncSession) -> list[UserPermissions]:
+        return list((await self._load(session)).values())
+
+    async def get_many(
+        self,
+        session: AsyncSession,
+        ids: list[str],
+    ) -> dict[str, UserPermissions]:
+        keys = uuid_keys(ids)
+        if not keys:
+            return {}
+
+        loaded = await self._load(session, any_of(UserRoleModel.user_id, keys))
+
+        # users without roles still get an (empty) entry, so they are cached too
+        return {
+            id_: loaded.get(key) or UserPermissions(masks={})
+            for key, id_ in keys.items()
+        }
+
+
+class _PermissionVersion:
+    # bumped by triggers on role and user_role writes; cached until a bus
+    # event says it may have moved
+    _version: int | None
+    _generation: int
+
+    def __init__(self) -> None:
+        self._version = None
+        self._generation = 0
+
+    async def get(self, session: AsyncSession) -> int:
+        # without the bus, changes made by other processes go unnoticed
+        if self._version is not None and invalidation_bus.connected:
+            return self._version
+
+        generation = self._generation
+        version = await session.scalar(
+            select(CacheVersionModel.version).where(
+                CacheVersionModel.name == _PERMISSION_VERSION,
+            ),
+        )
+
+        # an invalidation that raced the read may not be reflected in it
+        if generation == self._generation:
+            self._version = version or 0
+
+        return version or 0
+
+    def invalidate(self) -> None:
+        self._version = None
+        self._generation += 1
+
+
+class PermissionService:
+    _provider: _AnyProvider[UserPermissions]
+    _version: _PermissionVersion
+
+    def __init__(self, permission_provider: _AnyProvider[UserPermissions]) -> None:
+        self._provider = permission_provider
+        self._version = _PermissionVersion()
+
+        # compiled from role definitions and user-role links
+        for topic in (RoleModel.__tablename__, UserModel.__tablename__):
+            if isinstance(self._provider, ICachedProvider):
+                invalidation_bus.subscribe(topic, self._provider)
+
+            invalidation_bus.subscribe(topic, self._version)
+
+    async def get(self, session: AsyncSession, user_id: str) -> UserPermissions:
+        permissions = await self._provider.get(session, user_id)
+
+        return permissions or UserPermissions(masks={})
+
+    async def get_versioned(
+        self,
+        session: AsyncSession,
+        user_id: str,
+    ) -> tuple[UserPermissions, int]:
+        # taken before the read, a change racing it makes the pair outdated
+        version = await self._version.get(session)
+
+        return await self.get(session, user_id), version
+
+    async def is_current(self, session: AsyncSession, version: int) -> bool:
+        return version == await self._version.get(session)
+
+    def revoke(self, user_id: str) -> None:
+        self._version.invalidate()
+        # cached under the hex ids the user is authorized by
+        if isinstance(self._provider, IKeyedCache):
+            self._provider.invalidate_key(uuid.UUID(user_id).hex)
+        elif isinstance(self._provider, ICachedProvider):
+            self._provider.invalidate()
+
+
+permission_service = PermissionService(
+    permission_provider=CachedProvider(
+        _PermissionProvider(),
+        maxsize=settings.PROVIDER_CACHE_MAXSIZE,
+        ttl=settings.PROVIDER_CACHE_TTL,
+        cache_all=False,
+    ),
+)
@@ -0,0 +1,126 @@
+import asyncio
+import re
+from bisect import bisect_left, insort
+from typing import Awaitable, Callable, Iterable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.db import engine
+
+_WORD_RE = re.compile(r"\w+")
+
+_Loader = Callable[[AsyncSession], Awaitable[Iterable[tuple[str, str]]]]
+
+
+def _normalize(text: str) -> str:
+    return " ".join(_WORD_RE.findall(text.casefold()))
+
+
+def _suffixes(name: str) -> list[str]:
+    # one key per word start, so "blue suede shoes" is found by "sue" as well
+    normalized = _normalize(name)
+
+    return [normalized[m.start() :] for m in _WORD_RE.finditer(normalized)]
+
+
+class PrefixIndex:
+    _loader: _Loader
+    _keys: list[tuple[str, str]]
+    _names: dict[str, str]
+    _valid: bool
+    _generation: int
+    _rebuild: asyncio.Task | None
+
+    def __init__(self, loader: _Loader) -> None:
+        self._loader = loader
+        self._keys = []
+        self._names = {}
+        self._valid = False
+        self._generation = 0
+        self._rebuild = None
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    async def _build(self) -> None:
+        generation = self._generation
+        # the requesting session is closed if that request is cancelled
+        async with AsyncSession(engine) as session:
+            names = dict(await self._loader(session))
+
+        keys = [
+            (suffix, id_) for id_, name in names.items() for suffix in _suffixes(name)
+        ]
+        keys.sort()
+
+        self._keys = keys
+        self._names = names
+
+        if generation == self._generation:
+            self._valid = True
+
+    def _rebuild_done(self, _: asyncio.Task) -> None:
+        self._rebuild = None
+
+    async def _ensure(self) -> None:
+        if self._valid:
+            return
+
+        if not self._rebuild:
+            self._rebuild = asyncio.create_task(self._build())
+            self._rebuild.add_done_callback(self._rebuild_done)
+
+        await asyncio.shield(self._rebuild)
+
+    async def complete(self, prefix: str, limit: int) -> list[tuple[str, str]]:
+        prefix = _normalize(prefix)
+        if not prefix:
+            return []
+
+        await self._ensure()
+
+        keys = self._keys
+        found: dict[str, None] = {}
+
+        i = bisect_left(keys, (prefix,))
+        while i < len(keys) and len(found) < limit:
+            key, id_ = keys[i]
+            if not key.startswith(prefix):
+                break
+
+            found[id_] = None
+            i += 1
+
+        return [(id_, self._names[id_]) for id_ in found]
+
+    def _discard(self, id_: str) -> None:
+        name = self._names.pop(id_, None)
+        if name is None:
+            return
+
+        for suffix in _suffixes(name):
+            i = bisect_left(self._keys, (suffix, id_))
+            if i < len(self._keys) and self._keys[i] == (suffix, id_):
+                del self._keys[i]
+
+    def put(self, id_: str, name: str) -> None:
+        if not self._valid:
+            # a running build may have read the rows before this write
+            self.invalidate()
+            return
+
+        self._discard(id_)
+
+        self._names[id_] = name
+        for suffix in _suffixes(name):
+            insort(self._keys, (suffix, id_))
+
+    def remove(self, id_: str) -> None:
+        if not self._valid:
+            self.invalidate()
+            return
+
+        self._discard(id_)
+
+    def invalidate(self) -> None:
+        self._valid = False
+        self._generation += 1
@@ -1,18 +1,68 @@
-from typing import TypeAlias, TypeVar
+import uuid
+from decimal import Decimal, InvalidOperation
+from typing import Any, AsyncIterator, Iterable, Sequence, TypeAlias, TypeVar, cast
 
-from sqlalchemy import delete, select
+from sqlalchemy import (
+    ColumnElement,
+    CursorResult,
+    Row,
+    delete,
+    func,
+    literal,
+    literal_column,
+    or_,
+    select,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+from src.core.settings import settings
+from src.models import Category as CategoryModel
 from src.models import Product as ProductModel
-from src.schemas.product import CreateProduct, Product, UpdateProduct
+from src.models import product_search_vector
+from src.schemas.batch import Batch
+from src.schemas.product import (
+    CategoryFacet,
+    CreateProduct,
+    PriceBucket,
+    Product,
+    ProductFacets,
+    ProductFilter,
+    ProductPage,
+    ProductSearchHit,
+    ProductSearchPage,
+    ProductSort,
+    ProductSuggestion,
+    UpdateProduct,
+    UpsertProduct,
+    UpsertProductResult,
+    UpsertStatus,
+)
+from ulid import ULID
 
+from .cache import CachedProvider
+from .invalidation import invalidation_bus
+from .prefix_index import PrefixIndex
 from .protocol import ICachedProvider, IProvider
-from .utils import reserved_name_transformer
+from .utils import (
+    Some,
+    any_of,
+    decode_cursor,
+    encode_cursor,
+    make_batch,
+    metadata_clauses,
+    reserved_name_transformer,
+    uuid_keys,
+)
 
 _T = TypeVar("_T")
 _AnyProvider: TypeAlias = IProvider[_T] | ICachedProvider[_T]
 
 
-def _product_to_schema(obj: ProductModel) -> Product:
+def _product_to_schema(obj: ProductModel | Row) -> Product:
     return Product(
         id_=obj.id_.hex,
         name=obj.name,
@@ -22,6 +72,140 @@ def _product_to_schema(obj: ProductModel) -> Product:
     )
 
 
+_PRODUCT_FIELDS: dict[str, InstrumentedAttribute[Any]] = {
+    "id_": ProductModel.id_,
+    "name": ProductModel.name,
+    "price": ProductModel.price,
+    "category_id": ProductModel.category_id,
+    "metadata": ProductModel.metadata_,
+}
+
+_PRODUCT_COLUMNS = (
+    ProductModel.id_,
+    ProductModel.name,
+    ProductModel.price,
+    ProductModel.category_id,
+    ProductModel.metadata_,
+)
+
+# 5 parameters per row, psycopg allows at most 65535 per statement
+_UPSERT_CHUNK_SIZE = 10_000
+
+_SORT_COLUMNS: dict[ProductSort, InstrumentedAttribute[Any]] = {
+    ProductSort.id_: ProductModel.id_,
+    ProductSort.name: ProductModel.name,
+    ProductSort.price: ProductModel.price,
+}
+
+
+def _product_to_dict(row: Row, fields: list[str]) -> dict[str, Any]:
+    result = {}
+    for field in fields:
+        value = getattr(row, _PRODUCT_FIELDS[field].key)
+        result[field] = value.hex if isinstance(value, uuid.UUID) else value
+
+    return result
+
+
+def _product_cursor(sort: ProductSort, obj: ProductModel | Row) -> str:
+    key = None
+    if sort is ProductSort.name:
+        key = obj.name
+    elif sort is ProductSort.price:
+        # keep the exact numeric value, a float would not round-trip
+        key = str(obj.price)
+
+    return encode_cursor([sort.value, key, obj.id_.hex])
+
+
+def _after_cursor(sort: ProductSort, cursor: str) -> ColumnElement[bool]:
+    values = decode_cursor(cursor)
+    if len(values) != 3 or values[0] != sort.value:
+        raise ValueError("Cursor does not match sort key")
+
+    _, key, id_ = values
+    try:
+        id_ = uuid.UUID(id_)
+        if sort is ProductSort.price:
+            key = Decimal(key)
+    except (TypeError, ValueError, InvalidOperation) as e:
+        raise ValueError("Invalid cursor") from e
+
+    if sort is ProductSort.id_:
+        return ProductModel.id_ > id_
+
+    column = _SORT_COLUMNS[sort]
+
+    # row comparison, so the (<sort key>, id) index serves the predicate
+    return tuple_(column, ProductModel.id_) > tuple_(
+        literal(key, column.type),
+        literal(id_, ProductModel.id_.type),
+    )
+
+
+def _filter_clauses(product_filter: ProductFilter | None) -> list[ColumnElement[bool]]:
+    if not product_filter:
+        return []
+
+    clauses = []
+    if product_filter.category_ids is not None:
+        clauses.append(
+            any_of(
+                ProductModel.category_id,
+                map(uuid.UUID, product_filter.category_ids),
+            ),
+        )
+
+    if product_filter.metadata:
+        clauses.extend(
+            metadata_clauses(ProductModel.metadata_, product_filter.metadata),
+        )
+
+    # compare as numeric, a float parameter would make the price index unusable
+    if product_filter.price_min is not None:
+        clauses.append(
+            ProductModel.price
+            >= literal(
+                Decimal(str(product_filter.price_min)),
+                ProductModel.price.type,
+            ),
+        )
+
+    if product_filter.price_max is not None:
+        clauses.append(
+            ProductModel.price
+            <= literal(
+                Decimal(str(product_filter.price_max)),
+                ProductModel.price.type,
+            ),
+        )
+
+    return clauses
+
+
+def _after_search_cursor(
+    score: ColumnElement[float],
+    id_: ColumnElement,
+    cursor: str,
+) -> ColumnElement[bool]:
+    values = decode_cursor(cursor)
+    if len(values) != 2:
+        raise ValueError("Invalid cursor")
+
+    after_score, after_id = values
+    try:
+        after_score = float(after_score)
+        after_id = uuid.UUID(after_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    # ordered by score desc, id asc, so a row comparison does not fit
+    return or_(
+        score < after_score,
+        (score == after_score) & (id_ > after_id),
+    )
+
+
 class _ProductProvider:
     async def get(self, session: AsyncSession, id_: str) -> Product | None:
         product_obj = await session.get(ProductModel, id_)
@@ -35,12 +219,40 @@ class _ProductProvider:
 
         return list(map(_product_to_schema, products))
 
+    async def get_many(
+        self,
+        session: AsyncSession,
+        ids: list[str],
+    ) -> dict[str, Product]:
+        keys = uuid_keys(ids)
+        if not keys:
+            return {}
+
+        rows = await session.execute(
+            select(*_PRODUCT_COLUMNS).where(any_of(ProductModel.id_, keys)),
+        )
+
+        return {keys[row.id_]: _product_to_schema(row) for row in rows}
+
+
+async def _load_names(session: AsyncSession) -> list[tuple[str, str]]:
+    rows = await session.execute(select(ProductModel.id_, ProductModel.name))
+
+    return [(id_.hex, name) for id_, name in rows]
+
 
 class ProductService:
     _provider: _AnyProvider
+    _name_index: PrefixIndex
 
     def __init__(self, product_provider: _AnyProvider[Product]) -> None:
         self._provider = product_provider
+        self._name_index = PrefixIndex(_load_names)
+
+        if isinstance(self._provider, ICachedProvider):
+            invalidation_bus.subscribe(ProductModel.__tablename__, self._provider)
+
+        invalidation_bus.subscribe(ProductModel.__tablename__, self._name_index)
 
     async def get_all(self, session: AsyncSession) -> list[Product]:
         return await self._provider.get_all(session)
@@ -48,50 +260,444 @@ class ProductService:
     async def get(self, session: AsyncSession, id_: str) -> Product | None:
         return await self._provider.get(session, id_)
 
-    async def create(self, session: AsyncSession, product: CreateProduct) -> Product:
-        product_obj = ProductModel(
-            name=product.name,
-            price=product.price,
-            category_id=product.category_id,
-            metadata_=product.metadata,
+    async def get_many(self, session: AsyncSession, ids: list[str]) -> Batch[Product]:
+        return make_batch(ids, await self._provider.get_many(session, ids))
+
+    async def _get_page_rows(
+        self,
+        session: AsyncSession,
+        columns: Iterable[InstrumentedAttribute[Any]],
+        limit: int,
+        after: str | None,
+        sort: ProductSort,
+        product_filter: ProductFilter | None,
+    ) -> tuple[Sequence[Row], str | None]:
+        column = _SORT_COLUMNS[sort]
+
+        # the cursor is built from the sort key and id, select them regardless
+        columns = list(columns)
+        for key in (column, ProductModel.id_):
+            if not any(key is c for c in columns):
+                columns.append(key)
+
+        query = select(*columns).where(*_filter_clauses(product_filter))
+        if after:
+            query = query.where(_after_cursor(sort, after))
+
+        order_by = (column,) if sort is ProductSort.id_ else (column, ProductModel.id_)
+        query = query.order_by(*order_by).limit(limit + 1)
+
+        rows = (await session.execute(query)).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _product_cursor(sort, rows[-1])
+
+        return rows, next_cursor
+
+    async def get_page(
+        self,
+        session: AsyncSession,
+        limit: int,
+        after: str | None = None,
+        sort: ProductSort = ProductSort.id_,
+        product_filter: ProductFilter | None = None,
+    ) -> ProductPage:
+        rows, next_cursor = await self._get_page_rows(
+            session,
+            _PRODUCT_COLUMNS,
+            limit,
+            after,
+            sort,
+            product_filter,
+        )
+
+        return ProductPage(
+            items=list(map(_product_to_schema, rows)),
+            next_cursor=next_cursor,
         )
 
-        session.add(product_obj)
+    async def get_page_fields(
+        self,
+        session: AsyncSession,
+        fields: list[str],
+        limit: int,
+        after: str | None = None,
+        sort: ProductSort = ProductSort.id_,
+        product_filter: ProductFilter | None = None,
+    ) -> dict[str, Any]:
+        rows, next_cursor = await self._get_page_rows(
+            session,
+            [_PRODUCT_FIELDS[field] for field in fields],
+            limit,
+            after,
+            sort,
+            product_filter,
+        )
+
+        return {
+            "items": [_product_to_dict(row, fields) for row in rows],
+            "next_cursor": next_cursor,
+        }
+
+    async def get_fields(
+        self,
+        session: AsyncSession,
+        id_: str,
+        fields: list[str],
+    ) -> dict[str, Any] | None:
+        # single products come from the provider cache, only encoding is saved
+        product = await self._provider.get(session, id_)
+        if not product:
+            return None
+
+        return product.dict(include=set(fields))
+
+    async def search(
+        self,
+        session: AsyncSession,
+        q: str,
+        limit: int,
+        after: str | None = None,
+    ) -> ProductSearchPage:
+        tsquery = func.websearch_to_tsquery(text("'simple'::regconfig"), q)
+
+        # full-text rank for whole words, trigram word similarity for typos
+        # and partial words; either predicate is served by its own GIN index
+        hits = (
+            select(
+                *_PRODUCT_COLUMNS,
+                (
+                    func.ts_rank_cd(product_search_vector, tsquery)
+                    + func.word_similarity(q, ProductModel.name)
+                ).label("score"),
+            )
+            .where(
+                or_(
+                    product_search_vector.op("@@")(tsquery),
+                    literal(q).op("<%")(ProductModel.name),
+                ),
+            )
+            .subquery()
+        )
+
+        query = select(hits)
+        if after:
+            query = query.where(_after_search_cursor(hits.c.score, hits.c.id_, after))
+
+        rows = (
+            await session.execute(
+                query.order_by(hits.c.score.desc(), hits.c.id_).limit(limit + 1),
+            )
+        ).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([rows[-1].score, rows[-1].id_.hex])
+
+        return ProductSearchPage(
+            items=[
+                ProductSearchHit(
+                    **_product_to_schema(row).dict(),
+                    score=row.score,
+                )
+                for row in rows
+            ],
+            next_cursor=next_cursor,
+        )
+
+    async def autocomplete(self, prefix: str, limit: int) -> list[ProductSuggestion]:
+        matches = await self._name_index.complete(prefix, limit)
+
+        return [ProductSuggestion(id_=id_, name=name) for id_, name in matches]
+
+    async def get_facets(
+        self,
+        session: AsyncSession,
+        buckets: int,
+        product_filter: ProductFilter | None = None,
+    ) -> ProductFacets:
+        clauses = _filter_clauses(product_filter)
+
+        total, price_min, price_max = (
+            await session.execute(
+                select(
+                    func.count(),
+                    func.min(ProductModel.price),
+                    func.max(ProductModel.price),
+                ).where(*clauses),
+            )
+        ).one()
+
+        if not total:
+            return ProductFacets(total=0)
+
+        # price is read as float, keep all bucket bounds in Decimal
+        price_min, price_max = Decimal(str(price_min)), Decimal(str(price_max))
+        if product_filter and product_filter.price_min is not None:
+            price_min = Decimal(str(product_filter.price_min))
+        if product_filter and product_filter.price_max is not None:
+            price_max = Decimal(str(product_filter.price_max))
+
+        if price_max > price_min:
+            # width_bucket puts price == upper bound into bucket n + 1
+            bucket = func.least(
+                func.width_bucket(
+                    ProductModel.price,
+                    literal(price_min, ProductModel.price.type),
+                    literal(price_max, ProductModel.price.type),
+                    buckets,
+                ),
+                buckets,
+            ).label("bucket")
+            counts: dict[int, int] = dict(
+                (
+                    await session.execute(
+                        select(bucket, func.count()).where(*clauses).group_by(bucket),
+                    )
+                )
+                .tuples()
+                .all(),
+            )
+
+            width = (price_max - price_min) / buckets
+            price = [
+                PriceBucket(
+                    price_from=price_min + width * i,
+                    price_to=price_min + width * (i + 1),
+                    count=counts.get(i + 1, 0),
+                )
+                for i in range(buckets)
+            ]
+
+        else:
+            price = [PriceBucket(price_from=price_min, price_to=price_max, count=total)]
+
+        categories = (
+            await session.execute(
+                select(ProductModel.category_id, func.count())
+                .where(*clauses)
+                .group_by(ProductModel.category_id)
+                .order_by(func.count().desc()),
+            )
+        ).all()
+
+        return ProductFacets(
+            total=total,
+            price=price,
+            categories=[
+                CategoryFacet(
+                    category_id=category_id.hex if category_id else None,
+                    count=count,
+                )
+                for category_id, count in categories
+            ],
+        )
+
+    async def stream(
+        self,
+        session: AsyncSession,
+        fetch_size: int,
+    ) -> AsyncIterator[Product]:
+        # plain rows stay out of the identity map, server-side cursor
+        # hands them over fetch_size at a time
+        result = await session.stream(
+            select(*_PRODUCT_COLUMNS)
+            .order_by(ProductModel.id_)
+            .execution_options(yield_per=fetch_size),
+        )
+
+        async for row in result:
+            yield _product_to_schema(row)
+
+    async def create(self, session: AsyncSession, product: CreateProduct) -> Product:
+        row = (
+            await session.execute(
+                insert(ProductModel)
+                .values(
+                    name=product.name,
+                    price=product.price,
+                    category_id=product.category_id,
+                    metadata_=product.metadata,
+                )
+                .returning(*_PRODUCT_COLUMNS),
+            )
+        ).one()
+
+        await invalidation_bus.publish(session, ProductModel.__tablename__)
         await session.commit()
-        await session.refresh(product_obj)
 
         if isinstance(self._provider, ICachedProvider):
             self._provider.invalidate()
 
-        return _product_to_schema(product_obj)
+        self._name_index.put(row.id_.hex, row.name)
+
+        return _product_to_schema(row)
+
+    async def upsert_many(
+        self,
+        session: AsyncSession,
+        products: list[UpsertProduct],
+    ) -> list[UpsertProductResult]:
+        results: list[UpsertProductResult | None] = [None] * len(products)
+
+        def fail(index: int, detail: str) -> None:
+            results[index] = UpsertProductResult(
+                index=index,
+                status=UpsertStatus.failed,
+                product=None,
+                detail=detail,
+            )
+
+        rows: dict[uuid.UUID, tuple[int, dict]] = {}
+        category_ids: set[uuid.UUID] = set()
+        for index, product in enumerate(products):
+            try:
+                id_ = uuid.UUID(product.id_) if product.id_ else ULID().to_uuid()
+                category_id = (
+                    uuid.UUID(product.category_id) if product.category_id else None
+                )
+            except ValueError:
+                fail(index, "Invalid product or category id")
+                continue
+
+            if id_ in rows:
+                fail(index, "Duplicate product id")
+                continue
+
+            if category_id:
+                category_ids.add(category_id)
+
+            rows[id_] = index, {
+                "id_": id_,
+                "name": product.name,
+                "price": product.price,
+                "category_id": category_id,
+                "metadata_": product.metadata,
+            }
+
+        if category_ids:
+            existing = set(
+                (
+                    await session.scalars(
+                        select(CategoryModel.id_).where(
+                            any_of(CategoryModel.id_, category_ids),
+                        ),
+                    )
+                ).all(),
+            )
+
+            for id_, (index, row) in list(rows.items()):
+                if row["category_id"] and row["category_id"] not in existing:
+                    fail(index, "Invalid category id")
+                    del rows[id_]
+
+        values = [row for _, row in rows.values()]
+        for start in range(0, len(values), _UPSERT_CHUNK_SIZE):
+            stmt = insert(ProductModel).values(
+                values[start : start + _UPSERT_CHUNK_SIZE],
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ProductModel.id_],
+                set_={
+                    "name": stmt.excluded.name,
+                    "price": stmt.excluded.price,
+                    "category_id": stmt.excluded.category_id,
+                    "metadata": stmt.excluded.metadata,
+                },
+            ).returning(
+                *_PRODUCT_COLUMNS,
+                # xmax is only set on rows rewritten by DO UPDATE
+                literal_column("xmax = 0").label("created"),
+            )
+
+            for upserted in await session.execute(stmt):
+                index, _ = rows[upserted.id_]
+                results[index] = UpsertProductResult(
+                    index=index,
+                    status=UpsertStatus.created
+                    if upserted.created
+                    else UpsertStatus.updated,
+                    product=_product_to_schema(upserted),
+                    detail=None,
+                )
+
+        if rows:
+            await invalidation_bus.publish(session, ProductModel.__tablename__)
+            await session.commit()
+
+            if isinstance(self._provider, ICachedProvider):
+                self._provider.invalidate()
+
+            # one rebuild is cheaper than a sorted insert per row
+            self._name_index.invalidate()
+
+        return [Some(result) for result in results]
 
     async def update(
         self,
         session: AsyncSession,
         id_: str,
         product: UpdateProduct,
-    ) -> Product:
-        product_obj = await session.get(ProductModel, id_)
+    ) -> Product | None:
+        values = {
+            reserved_name_transformer(k): v
+            for k, v in product.dict(exclude_none=True).items()
+        }
+        if not values:
+            return await self._provider.get(session, id_)
 
-        for k, v in product.dict().items():
-            if v is not None:
-                setattr(product_obj, reserved_name_transformer(k), v)
+        row = (
+            await session.execute(
+                update(ProductModel)
+                .where(ProductModel.id_ == id_)
+                .values(values)
+                .returning(*_PRODUCT_COLUMNS),
+            )
+        ).one_or_none()
 
-        session.add(product_obj)
+        if not row:
+            await session.rollback()
+            return None
+
+        await invalidation_bus.publish(session, ProductModel.__tablename__)
         await session.commit()
-        await session.refresh(product_obj)
 
         if isinstance(self._provider, ICachedProvider):
             self._provider.invalidate()
 
-        return _product_to_schema(product_obj)
+        self._name_index.put(row.id_.hex, row.name)
+
+        return _product_to_schema(row)
+
+    async def delete(self, session: AsyncSession, id_: str) -> bool:
+        result = await session.execute(
+            delete(ProductModel).where(ProductModel.id_ == id_),
+        )
 
-    async def delete(self, session: AsyncSession, id_: str) -> None:
-        await session.execute(delete(ProductModel).where(ProductModel.id_ == id_))
+        if not cast(CursorResult, result).rowcount:
+            await session.rollback()
+            return False
+
+        await invalidation_bus.publish(session, ProductModel.__tablename__)
         await session.commit()
 
         if isinstance(self._provider, ICachedProvider):
             self._provider.invalidate()
 
+        self._name_index.remove(uuid.UUID(id_).hex)
+
+        return True
+
 
-product_service = ProductService(product_provider=_ProductProvider())
+product_service = ProductService(
+    product_provider=CachedProvider(
+        _ProductProvider(),
+        maxsize=settings.PROVIDER_CACHE_MAXSIZE,
+        ttl=settings.PROVIDER_CACHE_TTL,
+        negative_ttl=settings.PROVIDER_CACHE_NEGATIVE_TTL,
+        cache_all=False,
+    ),
+)
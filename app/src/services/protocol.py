@@ -3,6 +3,7 @@ from typing import Any, Protocol, TypeVar, runtime_checkable
 from sqlalchemy.ext.asyncio import AsyncSession
 
 _T = TypeVar("_T")
+_T_contra = TypeVar("_T_contra", contravariant=True)
 
 
 @runtime_checkable
@@ -13,6 +14,38 @@ class IProvider(Protocol[_T]):
     async def get_all(self, session: AsyncSession) -> list[_T]:
         pass
 
+    # found items keyed by the requested id, missing ids are left out
+    async def get_many(self, session: AsyncSession, ids: list[Any]) -> dict[Any, _T]:
+        pass
+
+
+@runtime_checkable
+class ITreeProvider(IProvider[_T], Protocol):
+    async def get_ancestors(self, session: AsyncSession, id_: Any) -> list[_T] | None:
+        pass
+
+    async def get_descendants(
+        self,
+        session: AsyncSession,
+        id_: Any,
+    ) -> list[_T] | None:
+        pass
+
+    async def is_descendant(
+        self,
+        session: AsyncSession,
+        id_: Any,
+        ancestor_id: Any,
+    ) -> bool:
+        pass
+
+
+@runtime_checkable
+class IEncodedProvider(Protocol):
+    # JSON encoded get_all result and its ETag
+    async def get_encoded(self, session: AsyncSession) -> tuple[bytes, str]:
+        pass
+
 
 @runtime_checkable
 class ICache(Protocol):
@@ -20,11 +53,42 @@ class ICache(Protocol):
         pass
 
 
+@runtime_checkable
+class IKeyedCache(ICache, Protocol):
+    def invalidate_key(self, id_: Any) -> None:
+        pass
+
+
 @runtime_checkable
 class ICachedProvider(IProvider[_T], ICache, Protocol):
     pass
 
 
+@runtime_checkable
+class ICachedTreeProvider(ITreeProvider[_T], ICache, Protocol):
+    pass
+
+
+@runtime_checkable
+class ITreeCache(ICache, Protocol[_T_contra]):
+    # adopts the version stamp produced by a local write, or invalidates
+    # itself when it is not exactly one write behind
+    def advance(self, version: int) -> bool:
+        pass
+
+    def insert(self, node: _T_contra) -> None:
+        pass
+
+    def edit(self, id_: Any, **fields: Any) -> None:
+        pass
+
+    def move(self, id_: Any, parent_id: Any) -> None:
+        pass
+
+    def remove(self, id_: Any) -> None:
+        pass
+
+
 @runtime_checkable
 class IService(Protocol[_T]):
     async def get(self, session: AsyncSession, *args, **kwargs) -> _T | None:
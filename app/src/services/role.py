@@ -1,18 +1,25 @@
-from typing import TypeAlias, TypeVar
+from typing import TypeAlias, TypeVar, cast
 
-from sqlalchemy import delete, select
+from sqlalchemy import CursorResult, Row, delete, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.settings import settings
 from src.models import Role as RoleModel
+from src.schemas.batch import Batch
 from src.schemas.role import CreateRole, Role, UpdateRole
 
+from .cache import CachedProvider
+from .invalidation import invalidation_bus
 from .protocol import ICachedProvider, IProvider
-from .utils import Some
+from .utils import any_of, make_batch, uuid_keys
 
 _T = TypeVar("_T")
 _AnyProvider: TypeAlias = IProvider[_T] | ICachedProvider[_T]
 
 
-def _role_to_schema(obj: RoleModel) -> Role:
+_ROLE_COLUMNS = (RoleModel.id_, RoleModel.name, RoleModel.permissions)
+
+
+def _role_to_schema(obj: RoleModel | Row) -> Role:
     return Role(
         id_=obj.id_.hex,
         name=obj.name,
@@ -33,6 +40,17 @@ class _RoleProvider:
 
         return list(map(_role_to_schema, roles))
 
+    async def get_many(self, session: AsyncSession, ids: list[str]) -> dict[str, Role]:
+        keys = uuid_keys(ids)
+        if not keys:
+            return {}
+
+        rows = await session.execute(
+            select(*_ROLE_COLUMNS).where(any_of(RoleModel.id_, keys)),
+        )
+
+        return {keys[row.id_]: _role_to_schema(row) for row in rows}
+
 
 class RoleService:
     _provider: _AnyProvider[Role]
@@ -40,65 +58,81 @@ class RoleService:
     def __init__(self, role_provider: _AnyProvider[Role]) -> None:
         self._provider = role_provider
 
+        if isinstance(self._provider, ICachedProvider):
+            invalidation_bus.subscribe(RoleModel.__tablename__, self._provider)
+
     async def get_all(self, session: AsyncSession) -> list[Role]:
         return await self._provider.get_all(session)
 
     async def get(self, session: AsyncSession, id_: str) -> Role | None:
         return await self._provider.get(session, id_)
 
-    async def get_many(self, session: AsyncSession, ids: list[str]) -> list[Role]:
-        roles = (
-            await session.scalars(
-                select(RoleModel).where(RoleModel.id_.in_(ids)),
-            )
-        ).all()
-
-        return roles
+    async def get_many(self, session: AsyncSession, ids: list[str]) -> Batch[Role]:
+        return make_batch(ids, await self._provider.get_many(session, ids))
 
     async def create(self, session: AsyncSession, create_role: CreateRole) -> Role:
-        role_obj = RoleModel(
-            name=create_role.name,
-            permissions=create_role.permissions,
-        )
+        row = (
+            await session.execute(
+                insert(RoleModel)
+                .values(name=create_role.name, permissions=create_role.permissions)
+                .returning(*_ROLE_COLUMNS),
+            )
+        ).one()
 
-        session.add(role_obj)
+        await invalidation_bus.publish(session, RoleModel.__tablename__)
         await session.commit()
 
-        if isinstance(self._provider, ICachedProvider):
-            self._provider.invalidate()
+        # also reaches caches of other entities that embed roles
+        invalidation_bus.invalidate(RoleModel.__tablename__)
 
-        role = Some(await self._provider.get(session, role_obj.id_.hex))
-
-        return role
+        return _role_to_schema(row)
 
     async def update(
         self,
         session: AsyncSession,
         id_: str,
         update_role: UpdateRole,
-    ) -> Role:
-        role_obj = await session.get(RoleModel, id_)
+    ) -> Role | None:
+        row = (
+            await session.execute(
+                update(RoleModel)
+                .where(RoleModel.id_ == id_)
+                .values(update_role.dict(exclude_none=True))
+                .returning(*_ROLE_COLUMNS),
+            )
+        ).one_or_none()
 
-        for k, v in update_role.dict().items():
-            if v is not None:
-                setattr(role_obj, k, v)
+        if not row:
+            await session.rollback()
+            return None
 
-        session.add(role_obj)
+        await invalidation_bus.publish(session, RoleModel.__tablename__)
         await session.commit()
 
-        if isinstance(self._provider, ICachedProvider):
-            self._provider.invalidate()
+        invalidation_bus.invalidate(RoleModel.__tablename__)
+
+        return _role_to_schema(row)
 
-        role = Some(await self._provider.get(session, id_))
+    async def delete(self, session: AsyncSession, id_: str) -> bool:
+        result = await session.execute(delete(RoleModel).where(RoleModel.id_ == id_))
 
-        return role
+        if not cast(CursorResult, result).rowcount:
+            await session.rollback()
+            return False
 
-    async def delete(self, session: AsyncSession, id_: str) -> None:
-        await session.execute(delete(RoleModel).where(RoleModel.id_ == id_))
+        await invalidation_bus.publish(session, RoleModel.__tablename__)
         await session.commit()
 
-        if isinstance(self._provider, ICachedProvider):
-            self._provider.invalidate()
+        invalidation_bus.invalidate(RoleModel.__tablename__)
+
+        return True
 
 
-role_service = RoleService(role_provider=_RoleProvider())
+role_service = RoleService(
+    role_provider=CachedProvider(
+        _RoleProvider(),
+        maxsize=settings.PROVIDER_CACHE_MAXSIZE,
+        ttl=settings.PROVIDER_CACHE_TTL,
+        negative_ttl=settings.PROVIDER_CACHE_NEGATIVE_TTL,
+    ),
+)
@@ -1,15 +1,21 @@
-from typing import TypeAlias, TypeVar
+from typing import TypeAlias, TypeVar, cast
 
-from sqlalchemy import delete, or_, select
+from sqlalchemy import CursorResult, Table, delete, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql.functions import array_agg
+from src.core.security import password_pool
+from src.core.settings import settings
 from src.models import Role as RoleModel
 from src.models import User as UserModel
 from src.models import UserRole as UserRoleModel
+from src.schemas.batch import Batch
 from src.schemas.user import CreateUser, UpdateUser, User
 
+from .cache import CachedProvider
+from .invalidation import invalidation_bus
+from .permission import permission_service
 from .protocol import ICachedProvider, IProvider
-from .utils import Some
+from .utils import Some, any_of, make_batch, uuid_keys
 
 _T = TypeVar("_T")
 _AnyProvider: TypeAlias = IProvider[_T] | ICachedProvider[_T]
@@ -35,7 +41,9 @@ class _UserProvider:
         if user_obj:
             roles = (
                 await session.scalars(
-                    select(RoleModel.name).join_from(RoleModel, UserRoleModel),
+                    select(RoleModel.name)
+                    .join_from(RoleModel, UserRoleModel)
+                    .where(UserRoleModel.user_id == user_obj.id_),
                 )
             ).all()
             return _user_to_schema(user_obj, roles=roles)
@@ -63,6 +71,28 @@ class _UserProvider:
             ),
         )
 
+    async def get_many(self, session: AsyncSession, ids: list[str]) -> dict[str, User]:
+        keys = uuid_keys(ids)
+        if not keys:
+            return {}
+
+        role_model_name_agg: array_agg[list[str]] = array_agg(RoleModel.name)
+        user_role_list = (
+            await session.execute(
+                select(UserModel, role_model_name_agg)
+                .select_from(UserModel)
+                .outerjoin(UserRoleModel, UserModel.id_ == UserRoleModel.user_id)
+                .outerjoin(RoleModel, UserRoleModel.role_id == RoleModel.id_)
+                .where(any_of(UserModel.id_, keys))
+                .group_by(UserModel.id_),
+            )
+        ).all()
+
+        return {
+            keys[user.id_]: _user_to_schema(user, roles if roles[0] else [])
+            for user, roles in user_role_list
+        }
+
 
 class RoleService:
     _provider: _AnyProvider[User]
@@ -70,12 +100,20 @@ class RoleService:
     def __init__(self, user_provider: _AnyProvider[User]) -> None:
         self._provider = user_provider
 
+        if isinstance(self._provider, ICachedProvider):
+            invalidation_bus.subscribe(UserModel.__tablename__, self._provider)
+            # users are served together with their role names
+            invalidation_bus.subscribe(RoleModel.__tablename__, self._provider)
+
     async def get_all(self, session: AsyncSession) -> list[User]:
         return await self._provider.get_all(session)
 
     async def get(self, session: AsyncSession, id_: str) -> User | None:
         return await self._provider.get(session, id_)
 
+    async def get_many(self, session: AsyncSession, ids: list[str]) -> Batch[User]:
+        return make_batch(ids, await self._provider.get_many(session, ids))
+
     async def get_by_email_username(
         self,
         session: AsyncSession,
@@ -97,12 +135,13 @@ class RoleService:
 
     async def create(self, session: AsyncSession, create_user: CreateUser) -> User:
         user_obj = UserModel(
-            username=create_user.name,
+            username=create_user.username,
             email=create_user.email,
-            password=create_user.password,
+            password_hash=await password_pool.hash(create_user.password),
         )
 
         session.add(user_obj)
+        await invalidation_bus.publish(session, UserModel.__tablename__)
         await session.commit()
 
         if isinstance(self._provider, ICachedProvider):
@@ -117,30 +156,78 @@ class RoleService:
         session: AsyncSession,
         id_: str,
         update_user: UpdateUser,
-    ) -> User:
-        user_obj = await session.get(UserModel, id_)
+    ) -> User | None:
+        values = update_user.dict(exclude_none=True)
+        if not values:
+            return await self._provider.get(session, id_)
+
+        if "password" in values:
+            values["password_hash"] = await password_pool.hash(values.pop("password"))
+
+        # the role names come back in the same statement as the update
+        # ORM updates cannot use RETURNING inside a CTE, so go through the table
+        user_table = cast(Table, UserModel.__table__)
+        updated = (
+            update(user_table)
+            .where(user_table.c.id == id_)
+            .values(values)
+            .returning(
+                user_table.c.id,
+                user_table.c.username,
+                user_table.c.email,
+                user_table.c.created_at,
+                user_table.c.updated_at,
+            )
+            .cte("updated_user")
+        )
+        row = (
+            await session.execute(
+                select(updated, array_agg(RoleModel.name))
+                .select_from(updated)
+                .outerjoin(UserRoleModel, UserRoleModel.user_id == updated.c.id)
+                .outerjoin(RoleModel, UserRoleModel.role_id == RoleModel.id_)
+                .group_by(*updated.c),
+            )
+        ).one_or_none()
 
-        for k, v in update_user.dict().items():
-            if v is not None:
-                setattr(user_obj, k, v)
+        if not row:
+            await session.rollback()
+            return None
 
-        session.add(user_obj)
+        await invalidation_bus.publish(session, UserModel.__tablename__)
         await session.commit()
 
         if isinstance(self._provider, ICachedProvider):
             self._provider.invalidate()
 
-        user = Some(await self._provider.get(session, id_))
+        user_id, username, email, created_at, updated_at, roles = row
 
-        return user
+        return User(
+            id_=user_id.hex,
+            username=username,
+            email=email,
+            created_at=created_at,
+            updated_at=updated_at,
+            roles=roles if roles[0] else [],
+        )
 
-    async def delete(self, session: AsyncSession, id_: str) -> None:
-        await session.execute(delete(UserModel).where(UserModel.id_ == id_))
+    async def delete(self, session: AsyncSession, id_: str) -> bool:
+        result = await session.execute(delete(UserModel).where(UserModel.id_ == id_))
+
+        if not cast(CursorResult, result).rowcount:
+            await session.rollback()
+            return False
+
+        await invalidation_bus.publish(session, UserModel.__tablename__)
         await session.commit()
 
         if isinstance(self._provider, ICachedProvider):
             self._provider.invalidate()
 
+        permission_service.revoke(id_)
+
+        return True
+
     async def add_roles(
         self,
         session: AsyncSession,
@@ -150,11 +237,24 @@ class RoleService:
         user_role = [UserRoleModel(id_, role_id) for role_id in role_ids]
 
         session.add_all(user_role)
+        await invalidation_bus.publish(session, UserModel.__tablename__)
         await session.commit()
 
+        if isinstance(self._provider, ICachedProvider):
+            self._provider.invalidate()
+
+        permission_service.revoke(id_)
+
         user = Some(await self._provider.get(session, id_))
 
         return user
 
 
-user_service = RoleService(user_provider=_UserProvider())
+user_service = RoleService(
+    user_provider=CachedProvider(
+        _UserProvider(),
+        maxsize=settings.PROVIDER_CACHE_MAXSIZE,
+        ttl=settings.PROVIDER_CACHE_TTL,
+        negative_ttl=settings.PROVIDER_CACHE_NEGATIVE_TTL,
+    ),
+)
@@ -1,4 +1,12 @@
-from typing import NoReturn, Optional, TypeVar
+import base64
+import json
+import uuid
+from typing import Any, Iterable, NoReturn, Optional, TypeVar
+
+from sqlalchemy import ColumnElement, any_, cast, literal
+from sqlalchemy.dialects.postgresql import ARRAY, JSONPATH
+from src.schemas.batch import Batch
+from src.schemas.filters import MetadataFilter
 
 
 def reserved_name_transformer(name: str) -> str:
@@ -14,3 +22,71 @@ def Some(obj: Optional[_T]) -> _T | NoReturn:
     assert obj is not None
 
     return obj
+
+
+def encode_cursor(values: list[Any]) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError as e:
+        raise ValueError("Invalid cursor") from e
+
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+
+    return values
+
+
+def any_of(column: Any, values: Iterable[Any]) -> ColumnElement[bool]:
+    # one array parameter instead of an IN list with a parameter per value
+    return column == any_(literal(list(values), ARRAY(column.type)))
+
+
+def uuid_keys(ids: Iterable[str]) -> dict[uuid.UUID, str]:
+    # maps parsed ids back to the strings they were requested as,
+    # ids that do not parse cannot exist and are left out
+    keys = {}
+    for id_ in ids:
+        try:
+            keys[uuid.UUID(id_)] = id_
+        except ValueError:
+            continue
+
+    return keys
+
+
+def canonical_id(id_: str) -> str | None:
+    # postgres also accepts uppercase and dashed forms, the caches key by hex
+    try:
+        return uuid.UUID(id_).hex
+    except ValueError:
+        return None
+
+
+def make_batch(ids: Iterable[str], found: dict[str, _T]) -> Batch[_T]:
+    ids = list(dict.fromkeys(ids))
+
+    return Batch(
+        items=[found[id_] for id_ in ids if id_ in found],
+        missing=[id_ for id_ in ids if id_ not in found],
+    )
+
+
+def metadata_clauses(
+    column: Any,
+    metadata: MetadataFilter,
+) -> list[ColumnElement[bool]]:
+    # only @> and @? are served by a jsonb_path_ops GIN index
+    clauses = [column.contains(value) for value in metadata.contains]
+
+    for key in metadata.has_keys:
+        path = '$."{}"'.format(key.replace("\\", "\\\\").replace('"', '\\"'))
+        clauses.append(column.op("@?", is_comparison=True)(cast(path, JSONPATH)))
+
+    return clauses